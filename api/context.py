@@ -0,0 +1,10 @@
+from flask import g
+from src.ticker_registry import TickerRegistry
+
+
+def get_ticker_registry() -> TickerRegistry:
+    # One registry per request, dropped when the request ends
+    if "ticker_registry" not in g:
+        g.ticker_registry = TickerRegistry()
+
+    return g.ticker_registry
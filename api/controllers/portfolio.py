@@ -1,12 +1,25 @@
-from flask import jsonify, request, render_template, redirect, url_for
+from flask import (
+    jsonify,
+    request,
+    render_template,
+    redirect,
+    url_for,
+    make_response,
+)
 from flask_login import (
     current_user,
     login_required,
 )
 
-from src.ticker import Ticker
 from src.portfolio import Portfolio
 from src.portfolio_repo import PortfolioRepo
+from src.yahoo_finance import TICKER_SNAPSHOT, HISTORIC_DIVIDENDS, HISTORIC_PRICES
+from src.utils import nan_to_none
+from src.portfolio_view import portfolio_views, build_portfolio_view
+from api.context import get_ticker_registry
+
+
+PORTFOLIO_PAGE_KINDS = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS, HISTORIC_PRICES)
 
 
 @login_required
@@ -18,61 +31,143 @@ def get_portfolio(portfolio_id: str):
         symbols = args.get("symbols", default=None)
 
         if symbols is None:
-            repo = PortfolioRepo()
-            portfolio = repo.get(portfolio_id)
+            repo = PortfolioRepo(get_ticker_registry())
+            portfolio = repo.get(
+                portfolio_id, prefetch=True, kinds=PORTFOLIO_PAGE_KINDS
+            )
             assert portfolio is not None, "Portfolio not found"
-
-            tickers = portfolio.tickers
         else:
             symbols = symbols.split(",")
-            tickers = [Ticker(symbol) for symbol in symbols]
+            tickers = get_ticker_registry().get_many(symbols)
             portfolio = Portfolio(tickers, current_user.id, portfolio_id)
 
-            repo = PortfolioRepo()
+            repo = PortfolioRepo(get_ticker_registry())
             repo.save(portfolio)
 
-        total_market_cap = sum([t.get_market_cap() for t in tickers])
-        total_div_yield = sum([t.get_dividend_yield() for t in tickers])
-
-        stocks = [
-            {
-                "symbol": t.symbol,
-                "company_name": t.get_company_name(),
-                "industry": t.get_industry(),
-                "sector": t.get_sector(),
-                "dividend_yield": t.get_dividend_yield(),
-                "current_price": t.get_current_price(),
-                "current_dividend_amount": t.current_year_div_per_share(),
-                "dividend_growth": t.get_yearly_dividend_growth(5),
-                "trailing_average_div_yield": t.get_trailing_average_div_yield(),
-                "dividend_ratios_per_year": t.get_yearly_ratios(),
-                "cadi": t.get_cadi(),
-                "beta": t.get_beta(),
-                "pe_ratio": t.get_pe_ratio(),
-                "eps_ratio": t.get_eps_ratio(),
-                "market_cap": t.get_market_cap(),
-                "equal_weight": (100 / len(tickers) / 100),
-                "market_cap_weight": (t.get_market_cap() / total_market_cap),
-                "div_yield_weight": (t.get_dividend_yield() / total_div_yield),
-                "ex_dividend_date": t.get_ex_dividend_date(),
-                "dividend_date": t.get_next_dividend_date(),
-            }
-            for t in tickers
-        ]
-        return render_template(
-            "portfolio.html",
-            amount=amount,
-            portfolio_id=portfolio_id,
-            stocks=stocks,
-            portfolio={
-                "average_dividend_yield": portfolio.get_average_dividend_yield(),
-                "average_market_cap": portfolio.get_average_market_cap(),
-                "average_pe": portfolio.get_average_pe(),
-                "average_eps": portfolio.get_average_eps(),
-                "average_beta": portfolio.get_average_beta(),
-                "average_cadi": portfolio.get_average_cadi(),
-            },
-            projections=portfolio.project(22, amount),
+            portfolio.prefetch(kinds=PORTFOLIO_PAGE_KINDS)
+
+        # Render the page without the symbols that failed to load
+        failed_symbols = {s: str(err) for s, err in portfolio.errors.items()}
+        if len(failed_symbols) > 0:
+            print(f"Failed to load symbols: {failed_symbols}")
+            portfolio = portfolio.without_symbols(list(failed_symbols.keys()))
+
+        assert len(portfolio.tickers) > 0, "Could not load any symbol in the portfolio"
+
+        # Unchanged portfolios are served from the rendered page, or not at all
+        # when the browser already has it. A page missing symbols is not kept,
+        # they may load next time.
+        key = portfolio_views.key(portfolio, amount)
+        cacheable = len(failed_symbols) == 0
+        if cacheable and request.if_none_match.contains(key):
+            response = make_response("", 304)
+        else:
+            page = portfolio_views.get(key) if cacheable else None
+            if page is None:
+                page = render_template(
+                    "portfolio.html",
+                    failed_symbols=failed_symbols,
+                    **build_portfolio_view(portfolio, amount),
+                )
+
+                if not cacheable:
+                    return page
+
+                portfolio_views.put(portfolio.id, key, page)
+
+            response = make_response(page)
+
+        response.set_etag(key)
+        response.headers["Cache-Control"] = "private, no-cache"
+
+        return response
+    except Exception as err:
+        print(err)
+        return jsonify({"status": "ERROR", "error": str(err)}), 500
+
+
+@login_required
+def get_portfolio_simulation(portfolio_id: str):
+    try:
+        args = request.args
+        amount = int(args.get("amount", default=1_000))
+        years = int(args.get("years", default=30))
+        paths = int(args.get("paths", default=10_000))
+        reinvest = args.get("reinvest", default="true") == "true"
+
+        assert 0 < years <= 100, "Years must be between 1 and 100"
+        assert 0 < paths <= 100_000, "Paths must be between 1 and 100000"
+
+        repo = PortfolioRepo(get_ticker_registry())
+        portfolio = repo.get(portfolio_id, prefetch=True)
+        assert portfolio is not None, "Portfolio not found"
+
+        portfolio = portfolio.without_symbols(list(portfolio.errors.keys()))
+        assert len(portfolio.tickers) > 0, "Could not load any symbol in the portfolio"
+
+        result = portfolio.simulate_income(amount, years, paths, reinvest)
+
+        return (
+            jsonify(
+                {
+                    "status": "OK",
+                    "data": {
+                        "years": result["year"].tolist(),
+                        "percentiles": result["percentiles"].tolist(),
+                        "income": result["income"].tolist(),
+                        "mean": result["mean"].tolist(),
+                    },
+                }
+            ),
+            200,
+        )
+    except Exception as err:
+        print(err)
+        return jsonify({"status": "ERROR", "error": str(err)}), 500
+
+
+@login_required
+def get_portfolio_backtest(portfolio_id: str):
+    try:
+        args = request.args
+        amount = int(args.get("amount", default=1_000))
+        years = int(args.get("years", default=30))
+        reinvest = args.get("reinvest", default="true") == "true"
+        weighting = args.get("weighting", default="equal")
+        rebalance_months = int(args.get("rebalance", default=0))
+
+        assert 0 < years <= 100, "Years must be between 1 and 100"
+        assert rebalance_months >= 0, "Rebalance must be a number of months"
+
+        repo = PortfolioRepo(get_ticker_registry())
+        portfolio = repo.get(portfolio_id, prefetch=True, kinds=PORTFOLIO_PAGE_KINDS)
+        assert portfolio is not None, "Portfolio not found"
+
+        portfolio = portfolio.without_symbols(list(portfolio.errors.keys()))
+        assert len(portfolio.tickers) > 0, "Could not load any symbol in the portfolio"
+
+        result = portfolio.backtest(
+            amount, reinvest, weighting, rebalance_months, years=years
+        )
+
+        return (
+            jsonify(
+                {
+                    "status": "OK",
+                    "data": {
+                        "months": result["months"].astype(str).tolist(),
+                        "invested": result["invested"].tolist(),
+                        "value": result["value"].tolist(),
+                        "income": result["income"].tolist(),
+                        "yield_on_cost": [
+                            nan_to_none(v) for v in result["yield_on_cost"].tolist()
+                        ],
+                        "years": result["years"].tolist(),
+                        "income_per_year": result["income_per_year"].tolist(),
+                    },
+                }
+            ),
+            200,
         )
     except Exception as err:
         print(err)
@@ -106,14 +201,14 @@ def post_add_symbol():
         assert symbol is not None, "Please provide a symbol"
         assert portfolio_id is not None, "Please provide a portfolio_id"
 
-        repo = PortfolioRepo()
+        repo = PortfolioRepo(get_ticker_registry())
         portfolio = repo.get(portfolio_id)
         assert portfolio is not None, "Could not find portfolio"
         assert (
             portfolio.user_id == current_user.id
         ), "You don't own the portfolio that you try to update"
 
-        portfolio.append_ticker(Ticker(symbol))
+        portfolio.append_ticker(repo.tickers.get(symbol))
         repo.save(portfolio)
 
         return redirect(url_for("get_portfolio", portfolio_id=portfolio_id))
@@ -147,7 +242,7 @@ def remove_symbol(symbol: str):
         portfolio_id = request.form.get("portfolio_id", default=None)
         assert portfolio_id is not None, "Please provide a portfolio_id"
 
-        repo = PortfolioRepo()
+        repo = PortfolioRepo(get_ticker_registry())
         portfolio = repo.get(portfolio_id)
         assert portfolio is not None, "Could not find portfolio"
         assert (
@@ -156,7 +251,7 @@ def remove_symbol(symbol: str):
 
         assert len(portfolio.tickers) > 1, "Portfolio must have at least one stock"
 
-        portfolio.remove_ticker(Ticker(symbol))
+        portfolio.remove_ticker(repo.tickers.get(symbol))
         repo.save(portfolio)
 
         return redirect(
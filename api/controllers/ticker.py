@@ -1,16 +1,24 @@
-from flask import jsonify, render_template, request
+from typing import Any, Callable, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+from flask import Response, jsonify, render_template, request
 from flask_login import (
     login_required,
 )
 
 from src.ticker import Ticker
-from src.yahoo_finance import YahooFinance
+from src.yahoo_finance import shared_yahoo_finance
+from api.context import get_ticker_registry
+
+
+# Every uncached symbol costs a couple of unthrottled Yahoo calls
+MAX_BULK_SYMBOLS = 50
 
 
 @login_required
 def get_ticker_info(symbol: str):
     try:
-        t = Ticker(symbol, YahooFinance())
+        t = get_ticker_registry().get(symbol)
         return render_template(
             "ticker.html",
             symbol=symbol,
@@ -30,10 +38,89 @@ def search_ticker():
         query = str(args.get("query", default=None))
         assert query is not None, "Query is None"
 
-        yf = YahooFinance()
+        yf = shared_yahoo_finance()
         results = yf.search_ticker(query)
 
         return jsonify({"results": results})
     except Exception as err:
         print(err)
         return jsonify({"status": "ERROR", "error": str(err)}), 500
+
+
+def ticker_indicators(t: Ticker) -> Dict[str, Any]:
+    return {
+        "dividend_yield": t.get_dividend_yield(),
+        "current_price": t.get_current_price(),
+        "current_dividend_amount": t.current_year_div_per_share(),
+        "dividend_growth": t.get_yearly_dividend_growth(5),
+        "dividend_ratios_per_year": t.get_yearly_ratios(),
+        "cadi": t.get_cadi(),
+        "beta": t.get_beta(),
+        "pe_ratio": t.get_pe_ratio(),
+        "eps_ratio": t.get_eps_ratio(),
+        "peg_ratio": t.get_peg_ratio(),
+        "market_cap": t.get_market_cap(),
+        "debt_to_equity": t.get_debt_to_equity(),
+        "intrinsec_value": t.ratios_valuation_model(),
+    }
+
+
+def ticker_company_basics(t: Ticker) -> Dict[str, Any]:
+    return {
+        "company_name": t.get_company_name(),
+        "industry": t.get_industry(),
+        "sector": t.get_sector(),
+    }
+
+
+def stream_per_symbol(build: Callable[[Ticker], Dict[str, Any]]):
+    # One NDJSON line per symbol, written as soon as that symbol is done
+    try:
+        symbols = request.args.get("symbols", default="")
+        symbols = list(dict.fromkeys(s for s in symbols.split(",") if s != ""))
+
+        assert len(symbols) > 0, "Please provide symbols"
+        assert (
+            len(symbols) <= MAX_BULK_SYMBOLS
+        ), f"At most {MAX_BULK_SYMBOLS} symbols per request"
+    except Exception as err:
+        return jsonify({"status": "ERROR", "error": str(err)}), 500
+
+    # Resolved here, the generator runs after the request context is gone
+    tickers = get_ticker_registry().get_many(symbols)
+    max_workers = min(shared_yahoo_finance().max_workers, len(tickers))
+
+    def generate():
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {pool.submit(build, t): t.symbol for t in tickers}
+        try:
+            for future in as_completed(futures):
+                try:
+                    line = {
+                        "symbol": futures[future],
+                        "status": "OK",
+                        "data": future.result(),
+                    }
+                except Exception as err:
+                    line = {
+                        "symbol": futures[future],
+                        "status": "ERROR",
+                        "error": str(err),
+                    }
+
+                yield json.dumps(line) + "\n"
+        finally:
+            # Stop fetching if the client went away mid-stream
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@login_required
+def get_bulk_indicators():
+    return stream_per_symbol(ticker_indicators)
+
+
+@login_required
+def get_bulk_company_basics():
+    return stream_per_symbol(ticker_company_basics)
@@ -1,25 +1,37 @@
 import os
-from flask import Flask, jsonify, render_template
+from flask import Flask, jsonify, render_template, request
 from flask_login import (
     LoginManager,
     current_user,
 )
 
-from src.ticker import Ticker
-
 from src.portfolio_repo import PortfolioRepo
 from src.user import User
 from src.utils import to_percentage, to_gbp_fmt, to_int, to_date
+from src.memory_cache import memory_cache
+from src.cache_index import cache_index
+from src.portfolio_view import portfolio_views
+from src.screener import shared_metrics_table, SCREEN_COLUMNS
 
+from api.context import get_ticker_registry
 from api.controllers.user import login, login_callback, logout
 from api.controllers.portfolio import (
     get_portfolio,
+    get_portfolio_simulation,
+    get_portfolio_backtest,
     get_add_symbol,
     post_add_symbol,
     set_amount,
     remove_symbol,
 )
-from api.controllers.ticker import get_ticker_info, search_ticker
+from api.controllers.ticker import (
+    get_ticker_info,
+    search_ticker,
+    ticker_indicators,
+    ticker_company_basics,
+    get_bulk_indicators,
+    get_bulk_company_basics,
+)
 
 
 # Initiate the Flask app
@@ -58,6 +70,18 @@ app.add_url_rule("/logout", methods=["GET"], view_func=logout)
 
 app.add_url_rule("/portfolio/<portfolio_id>", methods=["GET"], view_func=get_portfolio)
 
+app.add_url_rule(
+    f"{API_V1}/portfolio/<portfolio_id>/simulation",
+    methods=["GET"],
+    view_func=get_portfolio_simulation,
+)
+
+app.add_url_rule(
+    f"{API_V1}/portfolio/<portfolio_id>/backtest",
+    methods=["GET"],
+    view_func=get_portfolio_backtest,
+)
+
 app.add_url_rule("/portfolio/add", methods=["GET"], view_func=get_add_symbol)
 app.add_url_rule("/portfolio/add", methods=["POST"], view_func=post_add_symbol)
 
@@ -71,13 +95,23 @@ app.add_url_rule("/ticker/<symbol>", methods=["GET"], view_func=get_ticker_info)
 
 app.add_url_rule("/ticker/search", methods=["GET"], view_func=search_ticker)
 
+app.add_url_rule(
+    f"{API_V1}/dividends/indicators", methods=["GET"], view_func=get_bulk_indicators
+)
+
+app.add_url_rule(
+    f"{API_V1}/dividends/company-basics",
+    methods=["GET"],
+    view_func=get_bulk_company_basics,
+)
+
 
 @app.route("/", methods=["GET"])
 def index():
     try:
         if current_user.is_authenticated:
 
-            repo = PortfolioRepo()
+            repo = PortfolioRepo(get_ticker_registry())
             portfolios = repo.find_with_user_id(current_user.id)
             [print(p.id) for p in portfolios]
             return render_template(
@@ -95,7 +129,7 @@ def index():
 @app.route(f"{API_V1}/dividends/<symbol>/historic-per-year", methods=["GET"])
 def get_historic_per_year(symbol: str):
     try:
-        t = Ticker(symbol)
+        t = get_ticker_registry().get(symbol)
         return jsonify({"status": "OK", "data": t.get_dividends_per_year()}), 200
     except Exception as err:
         return jsonify({"status": "ERROR", "error": str(err)}), 500
@@ -104,26 +138,12 @@ def get_historic_per_year(symbol: str):
 @app.route(f"{API_V1}/dividends/<symbol>/indicators", methods=["GET"])
 def get_indicators(symbol: str):
     try:
-        t = Ticker(symbol)
+        t = get_ticker_registry().get(symbol)
         return (
             jsonify(
                 {
                     "status": "OK",
-                    "data": {
-                        "dividend_yield": t.get_dividend_yield(),
-                        "current_price": t.get_current_price(),
-                        "current_dividend_amount": t.current_year_div_per_share(),
-                        "dividend_growth": t.get_yearly_dividend_growth(5),
-                        "dividend_ratios_per_year": t.get_yearly_ratios(),
-                        "cadi": t.get_cadi(),
-                        "beta": t.get_beta(),
-                        "pe_ratio": t.get_pe_ratio(),
-                        "eps_ratio": t.get_eps_ratio(),
-                        "peg_ratio": t.get_peg_ratio(),
-                        "market_cap": t.get_market_cap(),
-                        "debt_to_equity": t.get_debt_to_equity(),
-                        "intrinsec_value": t.ratios_valuation_model(),
-                    },
+                    "data": ticker_indicators(t),
                 }
             ),
             200,
@@ -135,15 +155,58 @@ def get_indicators(symbol: str):
 @app.route(f"{API_V1}/dividends/<symbol>/company-basics", methods=["GET"])
 def get_company_basics(symbol: str):
     try:
-        t = Ticker(symbol)
+        t = get_ticker_registry().get(symbol)
+        return (
+            jsonify(
+                {
+                    "status": "OK",
+                    "data": ticker_company_basics(t),
+                }
+            ),
+            200,
+        )
+    except Exception as err:
+        return jsonify({"status": "ERROR", "error": str(err)}), 500
+
+
+@app.route(f"{API_V1}/screen", methods=["GET"])
+def screen():
+    # e.g. ?min_dividend_yield=0.03&max_payout_ratio=0.8&sort=cadi&order=desc
+    try:
+        args = request.args
+        ranges = {
+            name: (
+                args.get(f"min_{name}", default=None, type=float),
+                args.get(f"max_{name}", default=None, type=float),
+            )
+            for name in SCREEN_COLUMNS
+        }
+        sort_by = args.get("sort", default="dividend_yield")
+        descending = args.get("order", default="desc") == "desc"
+        page = args.get("page", default=1, type=int)
+        per_page = args.get("per_page", default=50, type=int)
+
+        assert page > 0, "Page must be 1 or more"
+        assert 0 < per_page <= 500, "Per page must be between 1 and 500"
+
+        total, results = shared_metrics_table().screen(
+            ranges,
+            sector=args.get("sector", default=None),
+            sort_by=sort_by,
+            descending=descending,
+            offset=(page - 1) * per_page,
+            limit=per_page,
+        )
+
         return (
             jsonify(
                 {
                     "status": "OK",
                     "data": {
-                        "company_name": t.get_company_name(),
-                        "industry": t.get_industry(),
-                        "sector": t.get_sector(),
+                        "total": total,
+                        "page": page,
+                        "per_page": per_page,
+                        "results": results,
                     },
                 }
             ),
@@ -153,5 +216,22 @@ def get_company_basics(symbol: str):
         return jsonify({"status": "ERROR", "error": str(err)}), 500
 
 
+@app.route(f"{API_V1}/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return (
+        jsonify(
+            {
+                "status": "OK",
+                "data": {
+                    "memory": memory_cache.stats(),
+                    "pages": portfolio_views.cache.stats(),
+                    "disk": cache_index.stats(),
+                },
+            }
+        ),
+        200,
+    )
+
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=8080, ssl_context="adhoc")
@@ -1,12 +1,35 @@
 from deta import App
 from api.main import app
-from src.utils import clear_deta_cache
+from src.yahoo_finance import shared_yahoo_finance
+from src.screener import MetricsTableBuilder, save_metrics_table
+from src.cache_warmer import warm_symbols, collect_portfolio_symbols
 
 
 app = App(app)
 
 
+def print_report(report):
+    print(
+        f"Warmed {report['symbols']} symbols in {report['seconds']}s, "
+        f"failed {report['failed']}"
+    )
+    for symbol, kinds in report["per_symbol"].items():
+        print(symbol, kinds)
+
+
 @app.lib.cron()
 def cron_job(event):
-    clear_deta_cache()
+    # Re-warm every cached and portfolio symbol instead of wiping the cache,
+    # throttled so the refresh stays under Yahoo's rate limits and no user
+    # request has to wait on a cold fetch afterwards
+    symbols = shared_yahoo_finance().get_cached_symbols() + collect_portfolio_symbols()
+    screener = MetricsTableBuilder()
+    report = warm_symbols(symbols, refresh=True, on_result=screener.add)
+    print_report(report)
+
+    # The screener table is rebuilt from the data just fetched
+    table = screener.build()
+    save_metrics_table(table)
+    print(f"Saved a screener table of {len(table)} symbols")
+
     return "Job completed"
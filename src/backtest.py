@@ -0,0 +1,89 @@
+from typing import List, Dict, Any
+import numpy as np
+from src.price_analytics import align_monthly, forward_fill, PERIODS_PER_YEAR
+
+
+def available_weights(weights: np.ndarray, listed: np.ndarray) -> np.ndarray:
+    # Spread the weights over the tickers that have a price, per month
+    weights = np.asarray(weights, dtype=np.float64)[:, None] * listed
+    total = weights.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, weights / total, 0)
+
+
+def backtest(
+    prices: List[np.ndarray],
+    dividends: List[List[dict]],
+    weights: np.ndarray,
+    invest_per_year: float,
+    reinvest: bool = True,
+    rebalance_months: int = 0,
+    months: int = None,
+) -> Dict[str, Any]:
+    # Replays a monthly contribution through the historic prices and dividends.
+    # Every month the dividends of the shares held are paid (and bought back
+    # into the same ticker at the close when reinvesting), the contribution is
+    # bought at the weights and, every `rebalance_months`, the holdings are
+    # brought back to the weights. Rows are tickers, columns are months.
+    aligned = align_monthly(prices, dividends)
+    dates = aligned["months"]
+    close, paid = forward_fill(aligned["close"]), aligned["dividends"]
+    if months is not None:
+        dates, close, paid = dates[-months:], close[:, -months:], paid[:, -months:]
+
+    listed = ~np.isnan(close)
+    close = np.where(listed, close, 1)
+    paid = np.where(listed, paid, 0)
+    weights = available_weights(weights, listed)
+    contribution = invest_per_year / PERIODS_PER_YEAR
+
+    # Between rebalances the shares follow s[t] = growth[t] * s[t - 1] + bought[t]
+    growth = 1 + paid / close if reinvest else np.ones(close.shape)
+    bought = contribution * weights / close
+
+    shares = np.zeros(close.shape)
+    periods = len(dates)
+    step = rebalance_months if rebalance_months > 0 else max(periods, 1)
+    held = np.zeros(close.shape[0])
+    for start in range(0, periods, step):
+        end = min(start + step, periods)
+        compounded = np.cumprod(growth[:, start:end], axis=1)
+        shares[:, start:end] = compounded * (
+            held[:, None] + np.cumsum(bought[:, start:end] / compounded, axis=1)
+        )
+
+        held = shares[:, end - 1]
+        if rebalance_months > 0:
+            value = (held * close[:, end - 1]).sum()
+            held = value * weights[:, end - 1] / close[:, end - 1]
+            shares[:, end - 1] = held
+
+    # Dividends are paid on the shares held at the end of the previous month
+    held_before = np.zeros(shares.shape)
+    held_before[:, 1:] = shares[:, :-1]
+    income = (held_before * paid).sum(axis=0)
+
+    value = (shares * close).sum(axis=0)
+    if not reinvest:
+        value += np.cumsum(income)
+
+    invested = contribution * np.arange(1, periods + 1)
+    trailing_income = np.cumsum(income)
+    trailing_income[PERIODS_PER_YEAR:] -= trailing_income[:-PERIODS_PER_YEAR].copy()
+
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    calendar_years, year_index = np.unique(years, return_inverse=True)
+
+    return {
+        "months": dates,
+        "invested": invested,
+        "value": value,
+        "income": income,
+        "yield_on_cost": trailing_income / invested,
+        "shares": shares,
+        "years": calendar_years,
+        "income_per_year": np.bincount(
+            year_index, weights=income, minlength=len(calendar_years)
+        ),
+    }
@@ -0,0 +1,187 @@
+from typing import Any, Dict, List
+from pathlib import Path
+import os
+import sqlite3
+import threading
+import time
+
+
+class CacheIndex:
+    # SQLite table with a row per cache file, so freshness checks, listing,
+    # eviction and stats never have to walk the cache directory. Hits are
+    # counted in memory and written in batches.
+    def __init__(self, path: str, flush_every: int = 100) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self._conn: sqlite3.Connection = None
+        self._pending_hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    prefix TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    ttl INTEGER NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_prefix ON entries(prefix)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)"
+            )
+            self._conn = conn
+
+        return self._conn
+
+    def get(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT path, size, created_at, ttl FROM entries WHERE key = ?",
+                    (key,),
+                )
+                .fetchone()
+            )
+
+        if row is None:
+            return None
+
+        return dict(zip(("path", "size", "created_at", "ttl"), row))
+
+    def record(
+        self,
+        key: str,
+        prefix: str,
+        label: str,
+        path: str,
+        size: int,
+        created_at: float,
+        ttl: int,
+    ) -> None:
+        # A rewritten entry keeps its hit count
+        with self._lock:
+            self._connection().execute(
+                """
+                INSERT INTO entries
+                    (key, prefix, label, path, size, created_at, ttl, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    path = excluded.path,
+                    size = excluded.size,
+                    created_at = excluded.created_at,
+                    ttl = excluded.ttl,
+                    accessed_at = excluded.accessed_at
+                """,
+                (key, prefix, label, path, size, created_at, ttl, created_at),
+            )
+
+    def touch(self, key: str) -> None:
+        with self._lock:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+            if len(self._pending_hits) < self.flush_every:
+                return
+
+            self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if len(self._pending_hits) == 0:
+            return
+
+        now = time.time()
+        self._connection().executemany(
+            "UPDATE entries SET hits = hits + ?, accessed_at = ? WHERE key = ?",
+            [(hits, now, key) for key, hits in self._pending_hits.items()],
+        )
+        self._pending_hits.clear()
+
+    def labels(self, prefix: str) -> List[str]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT DISTINCT label FROM entries WHERE prefix = ? ORDER BY label",
+                (prefix,),
+            )
+
+            return [label for (label,) in rows]
+
+    def evict(self, max_bytes: int) -> List[str]:
+        # Delete the least recently used files until the total fits again
+        with self._lock:
+            self._flush()
+            conn = self._connection()
+
+            (total,) = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            if total <= max_bytes:
+                return []
+
+            evicted = []
+            rows = conn.execute(
+                "SELECT key, path, size FROM entries ORDER BY accessed_at"
+            ).fetchall()
+            for key, path, size in rows:
+                if total <= max_bytes:
+                    break
+
+                if os.path.isfile(path):
+                    os.remove(path)
+                evicted.append(key)
+                total -= size
+
+            conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(k,) for k in evicted]
+            )
+
+            return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._flush()
+            rows = self._connection().execute(
+                """
+                SELECT prefix, COUNT(*), SUM(size), SUM(hits)
+                FROM entries GROUP BY prefix ORDER BY prefix
+                """
+            )
+            prefixes = {
+                prefix: {"entries": count, "size_bytes": size, "hits": hits}
+                for prefix, count, size, hits in rows
+            }
+
+        return {
+            "entries": sum(p["entries"] for p in prefixes.values()),
+            "size_bytes": sum(p["size_bytes"] for p in prefixes.values()),
+            "hits": sum(p["hits"] for p in prefixes.values()),
+            "prefixes": prefixes,
+        }
+
+
+# Deta only allows writing to /tmp
+cache_index = CacheIndex(
+    os.getenv(
+        "CACHE_INDEX_PATH",
+        "/tmp/cache-index.sqlite3"
+        if os.getenv("DETA_PROJECT_KEY")
+        else "./cache/index.sqlite3",
+    )
+)
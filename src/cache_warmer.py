@@ -0,0 +1,117 @@
+from typing import Any, Callable, Dict, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from src.storage import get_base
+from src.yahoo_finance import (
+    YahooFinance,
+    shared_yahoo_finance,
+    TICKER_SNAPSHOT,
+    HISTORIC_DIVIDENDS,
+    HISTORIC_PRICES,
+)
+
+
+WARM_KINDS = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS, HISTORIC_PRICES)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_sec: float) -> None:
+        self.interval = 1 / requests_per_sec if requests_per_sec > 0 else 0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.interval
+
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+def collect_portfolio_symbols() -> List[str]:
+    table = get_base("portfolios")
+
+    symbols = {}
+    last = None
+    while True:
+        resp = table.fetch(last=last)
+        for item in resp.items:
+            for symbol in item.get("symbols", []):
+                symbols[symbol] = True
+
+        last = resp.last
+        if last is None:
+            break
+
+    return list(symbols.keys())
+
+
+def warm_symbols(
+    symbols: Iterable[str],
+    kinds: Iterable[str] = WARM_KINDS,
+    max_workers: int = 4,
+    requests_per_sec: float = 2,
+    refresh: bool = False,
+    yahoo_finance: YahooFinance = None,
+    on_result: Callable[[str, str, Any], None] = None,
+) -> Dict[str, Any]:
+    # on_result gets every fetched value, or the raised exception, so a
+    # caller can use the data without reading it back from the cache
+    yf = shared_yahoo_finance() if yahoo_finance is None else yahoo_finance
+    fetchers = yf.fetchers(refresh)
+    for kind in kinds:
+        assert kind in fetchers, f"Unknown kind {kind}"
+
+    limiter = RateLimiter(requests_per_sec)
+
+    def warm(symbol: str, kind: str) -> Dict[str, Any]:
+        limiter.wait()
+        started_at = time.monotonic()
+        try:
+            result = fetchers[kind](symbol)
+            error = None
+        except Exception as err:
+            result = err
+            error = str(err)
+
+        if on_result is not None:
+            on_result(symbol, kind, result)
+
+        return {"seconds": round(time.monotonic() - started_at, 3), "error": error}
+
+    symbols = list(dict.fromkeys(symbols))
+    jobs = [(symbol, kind) for symbol in symbols for kind in kinds]
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+        results = list(pool.map(lambda job: warm(*job), jobs))
+
+    per_symbol = {symbol: {} for symbol in symbols}
+    for (symbol, kind), res in zip(jobs, results):
+        per_symbol[symbol][kind] = res
+
+    failed = [
+        symbol
+        for symbol, res in per_symbol.items()
+        if any(r["error"] is not None for r in res.values())
+    ]
+
+    return {
+        "symbols": len(symbols),
+        "failed": failed,
+        "seconds": round(time.monotonic() - started_at, 3),
+        "per_symbol": per_symbol,
+    }
+
+
+def warm_portfolio_symbols(**kwargs) -> Dict[str, Any]:
+    return warm_symbols(collect_portfolio_symbols(), **kwargs)
+
+
+if __name__ == "__main__":
+    from pprint import pprint
+
+    pprint(warm_portfolio_symbols())
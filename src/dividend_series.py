@@ -0,0 +1,67 @@
+from typing import List, Dict
+import numpy as np
+
+
+class DividendSeries:
+    def __init__(self, years: np.ndarray, amounts: np.ndarray) -> None:
+        self.years = years
+        self.amounts = amounts
+
+        # Growth between each year and the previous one, relative to the later year
+        self.growth_rates = (
+            np.abs(amounts[:-1] - amounts[1:]) / amounts[1:]
+            if len(amounts) > 1
+            else np.zeros(0)
+        )
+
+        self.per_year: Dict[int, float] = dict(zip(years.tolist(), amounts.tolist()))
+        self.cadi = self._calc_cadi()
+
+        self._average_growth: Dict[int, float] = {}
+
+    @classmethod
+    def from_events(
+        cls, events: List[dict], exclude_year: int = None
+    ) -> "DividendSeries":
+        dates = np.array([e["date"] for e in events], dtype=np.int64)
+        amounts = np.array([e["amount"] for e in events], dtype=np.float64)
+
+        years = dates.astype("datetime64[s]").astype("datetime64[Y]").astype(np.int64)
+        years = years + 1970
+        if exclude_year is not None:
+            keep = years != exclude_year
+            years, amounts = years[keep], amounts[keep]
+
+        unique_years, index = np.unique(years, return_inverse=True)
+        totals = np.bincount(index, weights=amounts, minlength=len(unique_years))
+
+        return cls(unique_years, totals)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def last_amount(self) -> float:
+        return float(self.amounts[-1])
+
+    def average_growth(self, last_years: int = None) -> float:
+        count = len(self.amounts) if last_years is None else last_years
+        count = min(count, len(self.amounts))
+        if count == 0:
+            return 0
+
+        if count not in self._average_growth:
+            rates = self.growth_rates[len(self.growth_rates) - (count - 1) :]
+            self._average_growth[count] = round(float(rates.sum()) / count, 4)
+
+        return self._average_growth[count]
+
+    def _calc_cadi(self) -> int:
+        if len(self.amounts) == 0:
+            return 0
+
+        # Count the years since the last dividend cut, including the first one
+        cuts = np.flatnonzero(self.amounts[1:] < self.amounts[:-1])
+        if len(cuts) == 0:
+            return len(self.amounts)
+
+        return int(len(self.amounts) - 1 - cuts[-1])
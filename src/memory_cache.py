@@ -0,0 +1,112 @@
+from typing import Any, Callable, Dict, List, Tuple
+from collections import OrderedDict
+import threading
+import time
+import os
+
+
+class MemoryCache:
+    # on_remove is called with the key of every entry that expires, is
+    # evicted, deleted or cleared, outside the lock
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        on_remove: Callable[[str], None] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.on_remove = on_remove
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> (value, size in bytes, expires at)
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, _, expires_at = entry
+            expired = time.time() >= expires_at
+            if expired:
+                self._remove(key)
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if expired:
+            self._notify([key])
+            return None
+
+        return value
+
+    def put(self, key: str, value: Any, size: int, expires_at: float) -> None:
+        # Entries bigger than the whole cache would evict everything else
+        if size > self.max_bytes:
+            return
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, expires_at)
+            self._size += size
+
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+                evicted.append(oldest)
+
+        self._notify(evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key not in self._entries:
+                return
+
+            self._remove(key)
+
+        self._notify([key])
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._size = 0
+
+        self._notify(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def _notify(self, keys: List[str]) -> None:
+        if self.on_remove is None:
+            return
+
+        for key in keys:
+            self.on_remove(key)
+
+
+memory_cache = MemoryCache(
+    max_bytes=int(os.getenv("MEMORY_CACHE_MAX_MB", "64")) * 1024 * 1024
+)
@@ -1,6 +1,20 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 from src.ticker import Ticker
+from src.yahoo_finance import (
+    YahooFinance,
+    shared_yahoo_finance,
+    TICKER_SNAPSHOT,
+    HISTORIC_DIVIDENDS,
+    HISTORIC_PRICES,
+)
+from src.price_store import PRICE_DTYPE
+from src import price_analytics
+from src.portfolio_frame import PortfolioFrame
+from src.projection import project_scenarios, ArrayLike, PROJECTION_DTYPE
+from src.simulation import simulate_income
+from src.backtest import backtest
 from datetime import datetime
+import numpy as np
 import uuid
 
 
@@ -11,51 +25,165 @@ class Portfolio:
         self.id = str(uuid.uuid4()) if id is None else id
         self.tickers = tickers
         self.user_id = user_id
+        self.errors: Dict[str, Exception] = {}
+        self.frame: PortfolioFrame = None
+
+    def get_frame(self) -> PortfolioFrame:
+        if self.frame is None:
+            self.frame = PortfolioFrame.from_tickers(self.tickers)
+
+        return self.frame
 
     def get_average_dividend_yield(self) -> float:
-        return sum([t.get_dividend_yield() for t in self.tickers]) / len(self.tickers)
+        return self.get_frame().average("dividend_yield")
 
     def get_average_market_cap(self) -> float:
-        return sum([t.get_market_cap() for t in self.tickers]) / len(self.tickers)
+        return self.get_frame().average("market_cap")
 
     def get_average_pe(self) -> float:
-        return sum([t.get_pe_ratio() for t in self.tickers]) / len(self.tickers)
+        return self.get_frame().average("pe_ratio")
 
     def get_average_eps(self) -> float:
-        return sum([t.get_eps_ratio() for t in self.tickers]) / len(self.tickers)
+        return self.get_frame().average("eps_ratio")
 
     def get_average_beta(self) -> float:
-        return sum([t.get_beta() for t in self.tickers]) / len(self.tickers)
+        return self.get_frame().average("beta")
 
     def get_average_cadi(self) -> float:
-        return sum([t.get_cadi() for t in self.tickers]) / len(self.tickers)
+        return self.get_frame().average("cadi")
 
     def project(self, years: int, invest_per_year: int) -> List[Dict[str, Any]]:
-        result = []
-
-        current_year = int(datetime.now().strftime("%Y"))
-        end_of_year = 0
-
-        for year in range(years):
-            start_of_year = invest_per_year + end_of_year
-            end_of_year = (
-                start_of_year + start_of_year * self.get_average_dividend_yield()
-            )
-
-            dividend_per_year = end_of_year - start_of_year
-            result.append(
-                {
-                    "year": current_year + year,
-                    "invest_per_year": invest_per_year,
-                    "start_of_year": start_of_year,
-                    "end_of_year": end_of_year,
-                    "dividend_per_year": dividend_per_year,
-                    "dividend_per_month": dividend_per_year / 12,
-                }
-            )
+        projection = self.project_scenarios(invest_per_year, years=years)[0]
+
+        return [
+            {name: row[name].item() for name in PROJECTION_DTYPE.names}
+            for row in projection
+        ]
+
+    def project_scenarios(
+        self,
+        invest_per_year: ArrayLike,
+        dividend_yield: ArrayLike = None,
+        dividend_growth: ArrayLike = 0.0,
+        reinvest: ArrayLike = True,
+        years: ArrayLike = 22,
+    ) -> np.ndarray:
+        if dividend_yield is None:
+            dividend_yield = self.get_average_dividend_yield()
+
+        return project_scenarios(
+            dividend_yield,
+            invest_per_year,
+            dividend_growth=dividend_growth,
+            reinvest=reinvest,
+            years=years,
+            start_year=datetime.now().year,
+        )
+
+    def simulate_income(
+        self,
+        invest_per_year: float,
+        years: int = 30,
+        paths: int = 10_000,
+        reinvest: bool = True,
+        weights: np.ndarray = None,
+        seed: int = None,
+        workers: int = 1,
+    ) -> Dict[str, np.ndarray]:
+        frame = self.get_frame()
+        if weights is None:
+            weights = frame.equal_weights()
+
+        result = simulate_income(
+            [t.get_dividend_series() for t in self.tickers],
+            weights,
+            frame.weighted_dividend_yield(weights),
+            invest_per_year,
+            years=years,
+            paths=paths,
+            reinvest=reinvest,
+            seed=seed,
+            workers=workers,
+        )
+        result["year"] = datetime.now().year + np.arange(years)
 
         return result
 
+    def get_price_analytics(self, weights: np.ndarray = None) -> Dict[str, Any]:
+        if weights is None:
+            weights = self.get_frame().equal_weights()
+
+        prices = [t.get_historic_prices() for t in self.tickers]
+        dividends = [t.get_historic_dividends() for t in self.tickers]
+
+        return {
+            "tickers": price_analytics.analyse_tickers(prices, dividends),
+            "portfolio": price_analytics.analyse_portfolio(prices, dividends, weights),
+        }
+
+    def get_weights(self, weighting: str = "equal") -> np.ndarray:
+        frame = self.get_frame()
+        weights = {
+            "equal": frame.equal_weights,
+            "market_cap": frame.market_cap_weights,
+            "yield": frame.div_yield_weights,
+        }
+        assert weighting in weights, f"Unknown weighting {weighting}"
+
+        return weights[weighting]()
+
+    def backtest(
+        self,
+        invest_per_year: float,
+        reinvest: bool = True,
+        weighting: str = "equal",
+        rebalance_months: int = 0,
+        years: int = None,
+    ) -> Dict[str, Any]:
+        return backtest(
+            [t.get_historic_prices() for t in self.tickers],
+            [t.get_historic_dividends() for t in self.tickers],
+            self.get_weights(weighting),
+            invest_per_year,
+            reinvest=reinvest,
+            rebalance_months=rebalance_months,
+            months=None if years is None else years * 12,
+        )
+
+    def prefetch(
+        self,
+        yahoo_finance: YahooFinance = None,
+        kinds: Iterable[str] = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS),
+    ) -> Dict[str, Exception]:
+        yf = shared_yahoo_finance() if yahoo_finance is None else yahoo_finance
+
+        # Tickers shared with an already loaded portfolio are not fetched again
+        cold = [t for t in self.tickers if not t.is_warm(kinds)]
+        prefetched = yf.get_many([t.symbol for t in cold], kinds)
+
+        errors = {}
+        for t in cold:
+            ticker_errors = t.warm(prefetched[t.symbol])
+
+            # Without its price history a ticker only misses the performance
+            # figures, it is kept with no prices instead of being dropped
+            if HISTORIC_PRICES in ticker_errors:
+                print(f"No prices for {t.symbol}: {ticker_errors[HISTORIC_PRICES]}")
+                t.historic_prices = np.empty(0, dtype=PRICE_DTYPE)
+                del ticker_errors[HISTORIC_PRICES]
+
+            if len(ticker_errors) > 0:
+                errors[t.symbol] = list(ticker_errors.values())[0]
+
+        self.errors = errors
+
+        return errors
+
+    def without_symbols(self, symbols: List[str]) -> "Portfolio":
+        return Portfolio(
+            [t for t in self.tickers if t.symbol not in symbols], self.user_id, self.id
+        )
+
     def to_list(self) -> list:
         return [t.symbol for t in self.tickers]
 
@@ -65,6 +193,7 @@ class Portfolio:
                 return None
 
         self.tickers.append(ticker)
+        self.frame = None
 
     def remove_ticker(self, ticker: Ticker) -> None:
         result = []
@@ -73,3 +202,4 @@ class Portfolio:
                 result.append(t)
 
         self.tickers = result
+        self.frame = None
@@ -0,0 +1,115 @@
+from typing import List, Dict
+import numpy as np
+from src.ticker import Ticker
+from src import valuation
+
+
+COLUMNS = (
+    "dividend_yield",
+    "market_cap",
+    "pe_ratio",
+    "eps_ratio",
+    "beta",
+    "current_price",
+    "debt_to_equity",
+    "cadi",
+    "dividend_growth",
+    "dividend_growth_10y",
+    "peg_ratio",
+)
+
+
+class PortfolioFrame:
+    def __init__(self, symbols: List[str], columns: Dict[str, np.ndarray]) -> None:
+        self.symbols = symbols
+        self.columns = columns
+
+    @classmethod
+    def from_tickers(cls, tickers: List[Ticker]) -> "PortfolioFrame":
+        # Read every metric once per ticker, missing values become NaN
+        rows = [
+            (
+                t.get_dividend_yield(),
+                t.get_market_cap(),
+                t.get_pe_ratio(),
+                t.get_eps_ratio(),
+                t.get_beta(),
+                t.get_current_price(),
+                t.get_debt_to_equity(),
+                t.get_cadi(),
+                t.get_yearly_dividend_growth(5),
+                t.get_yearly_dividend_growth(10),
+                t.get_peg_ratio(),
+            )
+            for t in tickers
+        ]
+        values = np.array(rows, dtype=np.float64).reshape(len(rows), len(COLUMNS))
+
+        return cls(
+            [t.symbol for t in tickers],
+            {name: values[:, i] for i, name in enumerate(COLUMNS)},
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def select(self, mask: np.ndarray) -> "PortfolioFrame":
+        return PortfolioFrame(
+            [s for s, keep in zip(self.symbols, mask) if keep],
+            {name: values[mask] for name, values in self.columns.items()},
+        )
+
+    def average(self, column: str) -> float:
+        return float(np.nanmean(self.columns[column]))
+
+    def total(self, column: str) -> float:
+        return float(np.nansum(self.columns[column]))
+
+    def equal_weights(self) -> np.ndarray:
+        return np.full(len(self), 1 / len(self))
+
+    def column_weights(self, column: str) -> np.ndarray:
+        values = np.nan_to_num(self.columns[column])
+        return values / values.sum()
+
+    def market_cap_weights(self) -> np.ndarray:
+        return self.column_weights("market_cap")
+
+    def div_yield_weights(self) -> np.ndarray:
+        return self.column_weights("dividend_yield")
+
+    def weighted_dividend_yield(self, weights: np.ndarray) -> float:
+        return float(np.dot(weights, np.nan_to_num(self.columns["dividend_yield"])))
+
+    def dividend_discount_values(self, rors: np.ndarray) -> np.ndarray:
+        dividend = valuation.current_dividend(
+            self.columns["dividend_yield"], self.columns["current_price"]
+        )
+
+        return valuation.dividend_discount_model(
+            dividend, self.columns["dividend_growth_10y"], rors
+        )
+
+    def discounted_cash_flow_values(
+        self, rors: np.ndarray, hold_years: int = 10
+    ) -> np.ndarray:
+        price = self.columns["current_price"]
+        dividend = valuation.current_dividend(self.columns["dividend_yield"], price)
+
+        return valuation.dividend_discount_model_v2(dividend, price, rors, hold_years)
+
+    def ratios_values(self) -> np.ndarray:
+        return valuation.ratios_valuation_model(
+            self.columns["eps_ratio"],
+            self.columns["pe_ratio"],
+            self.columns["peg_ratio"],
+        )
+
+    def undervalued(self, rors: np.ndarray) -> np.ndarray:
+        # One row per ticker and a column per rate of return
+        return valuation.undervalued(
+            self.columns["current_price"], self.dividend_discount_values(rors)
+        )
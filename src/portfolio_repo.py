@@ -1,26 +1,55 @@
-from typing import List
-import os
-from deta import Deta
+from typing import List, Iterable
+from src.storage import get_base
 from src.portfolio import Portfolio
-from src.ticker import Ticker
+from src.portfolio_view import portfolio_views
+from src.ticker_registry import TickerRegistry
+from src.yahoo_finance import TICKER_SNAPSHOT, HISTORIC_DIVIDENDS
+
+
+PUT_MANY_LIMIT = 25
+
+# Fields portfolios are fetched by
+PORTFOLIO_INDEXES = ("user_id",)
 
 
 class PortfolioRepo:
-    def __init__(self) -> None:
-        self.portfolio_table = Deta(os.getenv("DETA_PROJECT_KEY")).Base("portfolios")
+    def __init__(self, tickers: TickerRegistry = None) -> None:
+        self.portfolio_table = get_base("portfolios", indexes=PORTFOLIO_INDEXES)
+        self.tickers = TickerRegistry() if tickers is None else tickers
 
     def save(self, portfolio: Portfolio) -> None:
-        self.portfolio_table.put(
-            data={"symbols": portfolio.to_list(), "user_id": portfolio.user_id},
-            key=portfolio.id,
-        )
+        self.portfolio_table.put(data=self._to_item(portfolio), key=portfolio.id)
+        portfolio_views.invalidate(portfolio.id)
+
+    def save_many(self, portfolios: List[Portfolio]) -> None:
+        # Deta accepts at most 25 items per put_many
+        items = [{**self._to_item(p), "key": p.id} for p in portfolios]
+        for start in range(0, len(items), PUT_MANY_LIMIT):
+            self.portfolio_table.put_many(items[start : start + PUT_MANY_LIMIT])
 
-    def get(self, id: str) -> Portfolio:
+        for p in portfolios:
+            portfolio_views.invalidate(p.id)
+
+    def _to_item(self, portfolio: Portfolio) -> dict:
+        return {"symbols": portfolio.to_list(), "user_id": portfolio.user_id}
+
+    def get(
+        self,
+        id: str,
+        prefetch: bool = False,
+        kinds: Iterable[str] = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS),
+    ) -> Portfolio:
         item = self.portfolio_table.get(id)
         if item is None:
             return None
 
-        return Portfolio([Ticker(s) for s in item["symbols"]], item["user_id"], id)
+        portfolio = Portfolio(
+            self.tickers.get_many(item["symbols"]), item["user_id"], id
+        )
+        if prefetch:
+            portfolio.prefetch(kinds=kinds)
+
+        return portfolio
 
     def find_with_user_id(self, user_id: str) -> List[Portfolio]:
         resp = self.portfolio_table.fetch({"user_id": user_id})
@@ -29,7 +58,9 @@ class PortfolioRepo:
 
         return [
             Portfolio(
-                [Ticker(s) for s in item["symbols"]], item["user_id"], str(item["key"])
+                self.tickers.get_many(item["symbols"]),
+                item["user_id"],
+                str(item["key"]),
             )
             for item in resp.items
         ]
@@ -0,0 +1,160 @@
+from typing import Any, Dict, Set
+from datetime import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from src.portfolio import Portfolio
+from src.ticker import Ticker
+from src.memory_cache import MemoryCache
+from src.utils import nan_to_none
+
+
+def latest(series: np.ndarray) -> float:
+    return nan_to_none(series[-1]) if len(series) > 0 else None
+
+
+def build_portfolio_view(portfolio: Portfolio, amount: int) -> Dict[str, Any]:
+    # Everything the portfolio page shows, computed from the loaded tickers
+    tickers = portfolio.tickers
+
+    frame = portfolio.get_frame()
+    equal_weights = frame.equal_weights()
+    market_cap_weights = frame.market_cap_weights()
+    div_yield_weights = frame.div_yield_weights()
+
+    analytics = portfolio.get_price_analytics()
+    ticker_analytics = analytics["tickers"]
+    portfolio_analytics = analytics["portfolio"]
+
+    stocks = [
+        {
+            "symbol": t.symbol,
+            "company_name": t.get_company_name(),
+            "industry": t.get_industry(),
+            "sector": t.get_sector(),
+            "dividend_yield": t.get_dividend_yield(),
+            "current_price": t.get_current_price(),
+            "current_dividend_amount": t.current_year_div_per_share(),
+            "dividend_growth": t.get_yearly_dividend_growth(5),
+            "trailing_average_div_yield": t.get_trailing_average_div_yield(),
+            "dividend_ratios_per_year": t.get_yearly_ratios(),
+            "cadi": t.get_cadi(),
+            "beta": t.get_beta(),
+            "pe_ratio": t.get_pe_ratio(),
+            "eps_ratio": t.get_eps_ratio(),
+            "market_cap": t.get_market_cap(),
+            "equal_weight": float(equal_weights[i]),
+            "market_cap_weight": float(market_cap_weights[i]),
+            "div_yield_weight": float(div_yield_weights[i]),
+            "ex_dividend_date": t.get_ex_dividend_date(),
+            "dividend_date": t.get_next_dividend_date(),
+            "total_return": nan_to_none(ticker_analytics["total_return"][i]),
+            "cagr": nan_to_none(ticker_analytics["cagr"][i]),
+            "max_drawdown": nan_to_none(ticker_analytics["max_drawdown"][i]),
+            "volatility": latest(ticker_analytics["volatility"][i]),
+            "ttm_yield": latest(ticker_analytics["ttm_yield"][i]),
+        }
+        for i, t in enumerate(tickers)
+    ]
+
+    return {
+        "amount": amount,
+        "portfolio_id": portfolio.id,
+        "stocks": stocks,
+        "portfolio": {
+            "average_dividend_yield": portfolio.get_average_dividend_yield(),
+            "average_market_cap": portfolio.get_average_market_cap(),
+            "average_pe": portfolio.get_average_pe(),
+            "average_eps": portfolio.get_average_eps(),
+            "average_beta": portfolio.get_average_beta(),
+            "average_cadi": portfolio.get_average_cadi(),
+            "total_return": nan_to_none(portfolio_analytics["total_return"]),
+            "cagr": nan_to_none(portfolio_analytics["cagr"]),
+            "max_drawdown": nan_to_none(portfolio_analytics["max_drawdown"]),
+            "volatility": latest(portfolio_analytics["volatility"]),
+            "ttm_yield": latest(portfolio_analytics["ttm_yield"]),
+        },
+        "projections": portfolio.project(22, amount),
+    }
+
+
+def ticker_fingerprint(t: Ticker) -> list:
+    # Changes whenever a refresh brings new snapshot, dividend or price data
+    snapshot = None if t.snapshot is None else t.snapshot.to_dict()
+    dividends = t.historic_dividends or []
+    prices = t.historic_prices if t.historic_prices is not None else []
+
+    return [
+        t.symbol,
+        snapshot,
+        len(dividends),
+        dividends[-1] if len(dividends) > 0 else None,
+        len(prices),
+        prices[-1].tolist() if len(prices) > 0 else None,
+    ]
+
+
+class PortfolioViewCache:
+    # Rendered portfolio pages keyed by a hash of the portfolio content, the
+    # amount and the ticker data they were built from, so a page is only
+    # rendered again once one of those changes. Pages get a cache of their
+    # own, so they never push data entries out, and the keys kept per
+    # portfolio are dropped as soon as the cache lets go of a page.
+    def __init__(self, max_bytes: int, ttl_sec: int = 60 * 60) -> None:
+        self.cache = MemoryCache(max_bytes, on_remove=self._forget)
+        self.ttl_sec = ttl_sec
+        self._keys: Dict[str, Set[str]] = {}
+        self._portfolios: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def key(self, portfolio: Portfolio, amount: int) -> str:
+        content = json.dumps(
+            [
+                portfolio.id,
+                amount,
+                datetime.now().year,
+                [ticker_fingerprint(t) for t in portfolio.tickers],
+            ],
+            default=str,
+        )
+
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def get(self, key: str) -> str:
+        return self.cache.get(key)
+
+    def put(self, portfolio_id: str, key: str, page: str) -> None:
+        if len(page) > self.cache.max_bytes:
+            return
+
+        with self._lock:
+            self._keys.setdefault(portfolio_id, set()).add(key)
+            self._portfolios[key] = portfolio_id
+
+        self.cache.put(key, page, len(page), time.time() + self.ttl_sec)
+
+    def invalidate(self, portfolio_id: str) -> None:
+        with self._lock:
+            keys = self._keys.pop(portfolio_id, set())
+
+        for key in keys:
+            self.cache.delete(key)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            portfolio_id = self._portfolios.pop(key, None)
+            keys = self._keys.get(portfolio_id)
+            if keys is None:
+                return
+
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._keys[portfolio_id]
+
+
+portfolio_views = PortfolioViewCache(
+    int(os.getenv("PORTFOLIO_VIEW_CACHE_MAX_MB", "16")) * 1024 * 1024
+)
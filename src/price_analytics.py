@@ -0,0 +1,169 @@
+from typing import List, Dict, Any
+import numpy as np
+
+
+PERIODS_PER_YEAR = 12
+
+
+def align_monthly(
+    prices: List[np.ndarray], dividends: List[List[dict]]
+) -> Dict[str, np.ndarray]:
+    # Put every ticker on a shared monthly calendar, one row per ticker.
+    # Months without a price are NaN, months without a dividend are 0.
+    price_months = [
+        p["timestamp"].astype("datetime64[s]").astype("datetime64[M]") for p in prices
+    ]
+    months = np.unique(np.concatenate(price_months)) if len(prices) > 0 else []
+    months = np.asarray(months, dtype="datetime64[M]")
+
+    close = np.full((len(prices), len(months)), np.nan)
+    paid = np.zeros((len(prices), len(months)))
+    for i, (p, p_months, divs) in enumerate(zip(prices, price_months, dividends)):
+        close[i, np.searchsorted(months, p_months)] = p["close"]
+
+        if divs is None or len(divs) == 0:
+            continue
+
+        div_months = (
+            np.array([d["date"] for d in divs], dtype=np.int64)
+            .astype("datetime64[s]")
+            .astype("datetime64[M]")
+        )
+        amounts = np.array([d["amount"] for d in divs], dtype=np.float64)
+        columns = np.searchsorted(months, div_months)
+        in_range = columns < len(months)
+        in_range[in_range] = months[columns[in_range]] == div_months[in_range]
+        np.add.at(paid[i], columns[in_range], amounts[in_range])
+
+    return {"months": months, "close": close, "dividends": paid}
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    index = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def total_returns(close: np.ndarray, dividends: np.ndarray) -> np.ndarray:
+    # Monthly return with the dividend reinvested at the month's close,
+    # NaN before a ticker has a price
+    close = forward_fill(close)
+    returns = np.full(close.shape, np.nan)
+    returns[:, 1:] = (close[:, 1:] + dividends[:, 1:]) / close[:, :-1] - 1
+
+    return returns
+
+
+def growth_index(returns: np.ndarray) -> np.ndarray:
+    return np.cumprod(1 + np.nan_to_num(returns), axis=1)
+
+
+def ttm_yield(close: np.ndarray, dividends: np.ndarray) -> np.ndarray:
+    paid = np.cumsum(dividends, axis=1)
+    trailing = paid.copy()
+    trailing[:, PERIODS_PER_YEAR:] -= paid[:, :-PERIODS_PER_YEAR]
+
+    return trailing / forward_fill(close)
+
+
+def drawdown(index: np.ndarray) -> np.ndarray:
+    return index / np.maximum.accumulate(index, axis=1) - 1
+
+
+def rolling_volatility(
+    returns: np.ndarray, window: int = PERIODS_PER_YEAR
+) -> np.ndarray:
+    # Annualised standard deviation of the returns over a trailing window
+    valid = ~np.isnan(returns)
+    values = np.where(valid, returns, 0)
+
+    def trailing_sum(x: np.ndarray) -> np.ndarray:
+        total = np.cumsum(x, axis=1)
+        total[:, window:] = total[:, window:] - total[:, :-window]
+        return total
+
+    count = trailing_sum(valid.astype(np.float64))
+    total = trailing_sum(values)
+    squares = trailing_sum(values**2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = (squares - total**2 / count) / (count - 1)
+
+    volatility = np.sqrt(np.maximum(variance, 0) * PERIODS_PER_YEAR)
+    volatility[count < window] = np.nan
+
+    return volatility
+
+
+def summarise(
+    months: np.ndarray, returns: np.ndarray, yields: np.ndarray
+) -> Dict[str, Any]:
+    index = growth_index(returns)
+    drawdowns = drawdown(index)
+
+    # Series without a single return, e.g. a failed price history, are NaN
+    listed_months = (~np.isnan(returns)).sum(axis=1)
+    unlisted = listed_months == 0
+    growth = index[:, -1] if index.shape[1] > 0 else np.ones(len(index))
+    growth[unlisted] = np.nan
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cagr = growth ** (PERIODS_PER_YEAR / listed_months) - 1
+
+    max_drawdown = drawdowns.min(axis=1) if index.shape[1] > 0 else growth.copy()
+    max_drawdown[unlisted] = np.nan
+
+    return {
+        "months": months,
+        "total_return_index": index,
+        "total_return": growth - 1,
+        "cagr": cagr,
+        "ttm_yield": yields,
+        "drawdown": drawdowns,
+        "max_drawdown": max_drawdown,
+        "volatility": rolling_volatility(returns),
+    }
+
+
+def analyse_tickers(
+    prices: List[np.ndarray], dividends: List[List[dict]]
+) -> Dict[str, Any]:
+    # Every series has a row per ticker and a column per month
+    aligned = align_monthly(prices, dividends)
+    close, paid = aligned["close"], aligned["dividends"]
+
+    return summarise(
+        aligned["months"], total_returns(close, paid), ttm_yield(close, paid)
+    )
+
+
+def analyse_portfolio(
+    prices: List[np.ndarray], dividends: List[List[dict]], weights: np.ndarray
+) -> Dict[str, Any]:
+    # Rebalanced to the weights every month, a month only counts the tickers
+    # that had a price in it
+    aligned = align_monthly(prices, dividends)
+    close, paid = aligned["close"], aligned["dividends"]
+
+    returns = total_returns(close, paid)
+    yields = ttm_yield(close, paid)
+
+    available = np.asarray(weights, dtype=np.float64)[:, None] * ~np.isnan(returns)
+    total_weight = available.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        portfolio_returns = (np.nan_to_num(returns) * available).sum(
+            axis=0
+        ) / total_weight
+        portfolio_yields = (np.nan_to_num(yields) * available).sum(
+            axis=0
+        ) / total_weight
+
+    portfolio_returns[total_weight == 0] = np.nan
+
+    result = summarise(
+        aligned["months"], portfolio_returns[None, :], portfolio_yields[None, :]
+    )
+
+    return {k: v if k == "months" else v[0] for k, v in result.items()}
@@ -0,0 +1,84 @@
+from pathlib import Path
+import os
+import time
+from urllib.parse import quote
+import numpy as np
+
+
+PRICE_DTYPE = np.dtype(
+    [
+        ("timestamp", np.int64),
+        ("open", np.float64),
+        ("high", np.float64),
+        ("low", np.float64),
+        ("close", np.float64),
+        ("volume", np.float64),
+    ]
+)
+
+
+class PriceStore:
+    # One typed .npy file per key, loaded as a read-only memory map so the
+    # columns are never copied or turned into per-row objects.
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+
+    def load(self, key: str) -> np.ndarray:
+        path = self._path(key)
+        if not path.is_file():
+            return np.empty(0, dtype=PRICE_DTYPE)
+
+        return np.load(path, mmap_mode="r")
+
+    def age(self, key: str) -> float:
+        path = self._path(key)
+        if not path.is_file():
+            return None
+
+        return time.time() - path.stat().st_mtime
+
+    def merge(self, key: str, rows: np.ndarray, new_rows: np.ndarray) -> np.ndarray:
+        # Fetched bars replace every stored bar from the first fetched one on.
+        # Yahoo sends the month in progress stamped with the fetch time, so
+        # matching on exact timestamps would keep one such bar per fetch.
+        if len(new_rows) > 0:
+            rows = rows[rows["timestamp"] < new_rows["timestamp"].min()]
+
+        merged = np.concatenate([rows, new_rows.astype(PRICE_DTYPE)])
+        merged = merged[np.argsort(merged["timestamp"], kind="stable")]
+
+        self.save(key, merged)
+
+        return self.load(key)
+
+    def replace(self, key: str, rows: np.ndarray) -> np.ndarray:
+        # Rewrite the whole series from a full fetch and remember when
+        rows = rows.astype(PRICE_DTYPE)
+        self.save(key, rows[np.argsort(rows["timestamp"], kind="stable")])
+        self._synced_path(key).touch()
+
+        return self.load(key)
+
+    def synced_age(self, key: str) -> float:
+        # Seconds since the series was last replaced by a full fetch
+        path = self._synced_path(key)
+        if not path.is_file():
+            return None
+
+        return time.time() - path.stat().st_mtime
+
+    def save(self, key: str, rows: np.ndarray) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # Write next to the target and rename, open memory maps keep the old file
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.npy")
+        np.save(tmp_path, rows)
+        os.replace(tmp_path, path)
+
+    def _path(self, key: str) -> Path:
+        # Keys embed the symbol, escape them so one can never name a path elsewhere
+        return self.root / f"{quote(key, safe='')}.npy"
+
+    def _synced_path(self, key: str) -> Path:
+        return self.root / f"{quote(key, safe='')}.synced"
@@ -0,0 +1,75 @@
+from typing import Union
+import numpy as np
+
+
+ArrayLike = Union[float, int, bool, np.ndarray, list]
+
+PROJECTION_DTYPE = np.dtype(
+    [
+        ("year", np.int64),
+        ("invest_per_year", np.float64),
+        ("start_of_year", np.float64),
+        ("end_of_year", np.float64),
+        ("dividend_per_year", np.float64),
+        ("dividend_per_month", np.float64),
+    ]
+)
+
+
+def project_scenarios(
+    dividend_yield: ArrayLike,
+    invest_per_year: ArrayLike,
+    dividend_growth: ArrayLike = 0.0,
+    reinvest: ArrayLike = True,
+    years: ArrayLike = 22,
+    start_year: int = 0,
+) -> np.ndarray:
+    # Every argument is broadcast to one value per scenario, the result has a
+    # row per scenario and a column per year up to the longest horizon. Years
+    # past a scenario's horizon are NaN.
+    (
+        dividend_yield,
+        invest_per_year,
+        dividend_growth,
+        reinvest,
+        years,
+    ) = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(dividend_yield, dtype=np.float64)),
+        np.atleast_1d(np.asarray(invest_per_year, dtype=np.float64)),
+        np.atleast_1d(np.asarray(dividend_growth, dtype=np.float64)),
+        np.atleast_1d(np.asarray(reinvest, dtype=bool)),
+        np.atleast_1d(np.asarray(years, dtype=np.int64)),
+    )
+    scenarios = len(dividend_yield)
+    max_years = int(years.max()) if scenarios > 0 else 0
+    t = np.arange(max_years)
+
+    contribution = invest_per_year[:, None]
+    yields = dividend_yield[:, None] * (1 + dividend_growth[:, None]) ** t
+
+    # end_t = (contribution + end_t-1) * f_t, unrolled with cumulative products
+    growth = 1 + yields * reinvest[:, None]
+    cum_growth = np.cumprod(growth, axis=1)
+    prev_cum_growth = np.ones_like(cum_growth)
+    prev_cum_growth[:, 1:] = cum_growth[:, :-1]
+    end_of_year = contribution * cum_growth * np.cumsum(1 / prev_cum_growth, axis=1)
+
+    start_of_year = np.empty_like(end_of_year)
+    start_of_year[:, 0] = invest_per_year
+    start_of_year[:, 1:] = contribution + end_of_year[:, :-1]
+
+    dividend_per_year = start_of_year * yields
+
+    result = np.empty((scenarios, max_years), dtype=PROJECTION_DTYPE)
+    result["year"] = start_year + t
+    result["invest_per_year"] = contribution
+    result["start_of_year"] = start_of_year
+    result["end_of_year"] = end_of_year
+    result["dividend_per_year"] = dividend_per_year
+    result["dividend_per_month"] = dividend_per_year / 12
+
+    beyond_horizon = t[None, :] >= years[:, None]
+    for field in PROJECTION_DTYPE.names[1:]:
+        result[field][beyond_horizon] = np.nan
+
+    return result
@@ -0,0 +1,266 @@
+from typing import List, Dict, Any, Tuple
+from pathlib import Path
+import io
+import os
+import threading
+import time
+import numpy as np
+from src.ticker import Ticker
+from src.portfolio_frame import PortfolioFrame
+from src.storage import get_drive
+from src.utils import DETA_DRIVER_NAME, write_atomic
+from src.yahoo_finance import TICKER_SNAPSHOT, HISTORIC_DIVIDENDS
+
+
+SCREEN_COLUMNS = (
+    "dividend_yield",
+    "cadi",
+    "payout_ratio",
+    "pe_ratio",
+    "beta",
+    "debt_to_equity",
+    "dividend_growth",
+)
+
+SCREEN_KINDS = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS)
+
+# The whole table is stored as one file, next to the cache entries
+METRICS_TABLE_FILE = "screener_metrics.npz"
+METRICS_TABLE_PATH = Path("./cache") / METRICS_TABLE_FILE
+
+
+def latest_payout_ratio(ticker: Ticker) -> float:
+    ratios = ticker.get_yearly_ratios() or []
+    if len(ratios) == 0:
+        return None
+
+    return max(ratios, key=lambda r: r["year"])["payout_ratio"]
+
+
+class MetricsTable:
+    # One row per symbol and one column per metric, with every column sorted
+    # once up front so a screen is a mask and a slice of the sorted order.
+    def __init__(
+        self,
+        symbols: List[str],
+        company_names: List[str],
+        sectors: List[str],
+        columns: Dict[str, np.ndarray],
+        built_at: float = None,
+    ) -> None:
+        self.symbols = list(symbols)
+        self.company_names = [n or None for n in company_names]
+        self.sectors = np.array([s or "" for s in sectors], dtype=object)
+        self.columns = columns
+        self.built_at = time.time() if built_at is None else built_at
+
+        # NaN sorts last in an ascending argsort
+        self.indexes = {
+            name: np.argsort(values, kind="stable") for name, values in columns.items()
+        }
+        self.valid_counts = {
+            name: int((~np.isnan(values)).sum()) for name, values in columns.items()
+        }
+
+    @classmethod
+    def from_tickers(cls, tickers: List[Ticker]) -> "MetricsTable":
+        frame = PortfolioFrame.from_tickers(tickers)
+        columns = {
+            name: frame[name] for name in SCREEN_COLUMNS if name != "payout_ratio"
+        }
+        columns["payout_ratio"] = np.array(
+            [latest_payout_ratio(t) for t in tickers], dtype=np.float64
+        )
+
+        return cls(
+            frame.symbols,
+            [t.get_company_name() for t in tickers],
+            [t.get_sector() for t in tickers],
+            columns,
+        )
+
+    @classmethod
+    def empty(cls) -> "MetricsTable":
+        return cls([], [], [], {name: np.zeros(0) for name in SCREEN_COLUMNS})
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            symbols=np.array(self.symbols, dtype=str),
+            company_names=np.array([n or "" for n in self.company_names], dtype=str),
+            sectors=np.array(list(self.sectors), dtype=str),
+            built_at=np.array(self.built_at),
+            **{f"column_{name}": values for name, values in self.columns.items()},
+        )
+
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MetricsTable":
+        with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+            return cls(
+                stored["symbols"].tolist(),
+                stored["company_names"].tolist(),
+                stored["sectors"].tolist(),
+                {name: stored[f"column_{name}"] for name in SCREEN_COLUMNS},
+                float(stored["built_at"]),
+            )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def order(self, sort_by: str, descending: bool) -> np.ndarray:
+        index = self.indexes[sort_by]
+        if not descending:
+            return index
+
+        # Reversed, but symbols without the metric still come last
+        valid = self.valid_counts[sort_by]
+        return np.concatenate([index[:valid][::-1], index[valid:]])
+
+    def screen(
+        self,
+        ranges: Dict[str, Tuple[float, float]] = None,
+        sector: str = None,
+        sort_by: str = "dividend_yield",
+        descending: bool = True,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        assert sort_by in self.columns, f"Cannot sort by {sort_by}"
+
+        # A symbol missing a filtered metric never matches the filter
+        mask = np.ones(len(self), dtype=bool)
+        for name, (low, high) in (ranges or {}).items():
+            assert name in self.columns, f"Cannot filter by {name}"
+            values = self.columns[name]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+
+        if sector is not None:
+            mask &= self.sectors == sector
+
+        order = self.order(sort_by, descending)
+        matches = order[mask[order]]
+
+        return len(matches), [self.row(i) for i in matches[offset : offset + limit]]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        row = {
+            "symbol": self.symbols[i],
+            "company_name": self.company_names[i],
+            "sector": self.sectors[i] or None,
+        }
+        for name, values in self.columns.items():
+            row[name] = None if np.isnan(values[i]) else values[i].item()
+
+        return row
+
+
+class MetricsTableBuilder:
+    # Collects the snapshots and dividends a warm-up fetches, passed to
+    # warm_symbols as on_result, so the table is built without reading the
+    # cache again. A symbol without dividends is kept as a non-payer.
+    def __init__(self) -> None:
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, symbol: str, kind: str, result: Any) -> None:
+        if kind not in SCREEN_KINDS:
+            return
+
+        with self._lock:
+            self._results.setdefault(symbol, {})[kind] = result
+
+    def build(self) -> MetricsTable:
+        tickers = []
+        for symbol, results in self._results.items():
+            t = Ticker(symbol)
+            errors = t.warm(results)
+            if TICKER_SNAPSHOT in errors or t.snapshot is None:
+                continue
+
+            if t.historic_dividends is None:
+                t.historic_dividends = []
+            tickers.append(t)
+
+        return MetricsTable.from_tickers(tickers) if tickers else MetricsTable.empty()
+
+
+def save_metrics_table(table: MetricsTable) -> None:
+    data = table.to_bytes()
+
+    # Check if this is running on Deta
+    if os.getenv("DETA_PROJECT_KEY") is not None:
+        get_drive(DETA_DRIVER_NAME).put(METRICS_TABLE_FILE, data=data)
+        return
+
+    METRICS_TABLE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(METRICS_TABLE_PATH, data)
+
+
+def load_metrics_table() -> MetricsTable:
+    if os.getenv("DETA_PROJECT_KEY") is not None:
+        file = get_drive(DETA_DRIVER_NAME).get(METRICS_TABLE_FILE)
+        data = None if file is None else file.read()
+    else:
+        data = METRICS_TABLE_PATH.read_bytes() if METRICS_TABLE_PATH.is_file() else None
+
+    return MetricsTable.empty() if data is None else MetricsTable.from_bytes(data)
+
+
+_table: MetricsTable = None
+_loaded_at = 0.0
+_table_lock = threading.Lock()
+_reloading = threading.Event()
+
+
+def shared_metrics_table(max_age_sec: int = 600) -> MetricsTable:
+    # The table is built by the cron job and stored as a single file. A
+    # request only ever reads it: the first one loads the file, later ones
+    # get the table in memory while a newer file is picked up in the
+    # background and swapped in.
+    global _table, _loaded_at
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table, _loaded_at = load_metrics_table(), time.time()
+
+        return _table
+
+    if time.time() - _loaded_at > max_age_sec and not _reloading.is_set():
+        _reloading.set()
+        threading.Thread(target=_reload_metrics_table, daemon=True).start()
+
+    return _table
+
+
+def _reload_metrics_table() -> None:
+    global _table, _loaded_at
+    try:
+        table = load_metrics_table()
+        with _table_lock:
+            _table, _loaded_at = table, time.time()
+    except Exception as err:
+        print(f"Failed to reload the screener table: {err}")
+    finally:
+        _reloading.clear()
+
+
+if __name__ == "__main__":
+    from src.cache_warmer import warm_symbols
+    from src.yahoo_finance import shared_yahoo_finance
+
+    # Build the table from the cached symbols without waiting for the cron job
+    builder = MetricsTableBuilder()
+    warm_symbols(
+        shared_yahoo_finance().get_cached_symbols(),
+        kinds=SCREEN_KINDS,
+        on_result=builder.add,
+    )
+    table = builder.build()
+    save_metrics_table(table)
+    print(f"Saved a screener table of {len(table)} symbols")
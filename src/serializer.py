@@ -0,0 +1,117 @@
+from typing import Any, NamedTuple, Tuple
+import gzip
+import json
+import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Every entry starts with "DC<version> <codec> <compression> <created at>\n".
+# Version 1 headers have no creation time, and entries written before the
+# header existed are plain JSON, both are still read.
+MAGIC = b"DC"
+VERSION = 2
+
+CODECS = ("json", "orjson")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+
+def encode(value: Any, codec: str) -> bytes:
+    if codec == "orjson":
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def decode(data: bytes, codec: str) -> Any:
+    # orjson writes plain JSON, so it still loads where orjson is missing
+    if codec == "orjson" and orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+
+    return data
+
+
+def decompress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return data
+
+
+class Entry(NamedTuple):
+    value: Any
+    # Encoded length before compression, what memory sizing should go by
+    size: int
+    # Unix time the entry was written, None when the entry does not record it
+    created_at: float
+
+
+class Serializer:
+    def __init__(self, codec: str = "json", compression: str = "none") -> None:
+        assert codec in CODECS, f"Unknown codec {codec}"
+        assert compression in COMPRESSIONS, f"Unknown compression {compression}"
+        assert codec != "orjson" or orjson is not None, "orjson is not installed"
+        assert (
+            compression != "zstd" or zstandard is not None
+        ), "zstandard is not installed"
+
+        self.codec = codec
+        self.compression = compression
+        self.header = f"DC{VERSION} {codec} {compression}"
+
+    def dumps(self, value: Any, created_at: float = None) -> Tuple[bytes, int]:
+        created_at = time.time() if created_at is None else created_at
+        header = f"{self.header} {int(created_at)}\n".encode()
+        encoded = encode(value, self.codec)
+
+        return header + compress(encoded, self.compression), len(encoded)
+
+    def loads(self, data: bytes) -> Entry:
+        # Entries are read with the codec they were written with, whatever
+        # the current settings are
+        if isinstance(data, str):
+            data = data.encode()
+
+        if not data.startswith(MAGIC):
+            return Entry(json.loads(data), len(data), None)
+
+        (codec, compression, created_at), payload = parse_header(data)
+        encoded = decompress(payload, compression)
+
+        return Entry(decode(encoded, codec), len(encoded), created_at)
+
+
+def parse_header(data: bytes) -> Tuple[Tuple[str, str, float], bytes]:
+    header, payload = data.split(b"\n", 1)
+    version, codec, compression, *rest = header.decode().split(" ")
+    assert int(version[len(MAGIC) :]) <= VERSION, f"Unknown cache version {version}"
+
+    created_at = float(rest[0]) if len(rest) > 0 else None
+
+    return (codec, compression, created_at), payload
+
+
+serializer = Serializer(
+    os.getenv("CACHE_CODEC", "orjson" if orjson is not None else "json"),
+    os.getenv("CACHE_COMPRESSION", "none"),
+)
@@ -0,0 +1,123 @@
+from typing import List, Dict, Sequence
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.dividend_series import DividendSeries
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def portfolio_growth_by_year(
+    series: List[DividendSeries], weights: np.ndarray, min_coverage: float = 0.5
+) -> np.ndarray:
+    # Weighted dividend growth of the portfolio for every calendar year in the
+    # histories, using only the tickers that paid in both that year and the
+    # previous one. A ticker's first year is usually partial, so it is never
+    # used as a base, and years where the tickers with data hold less than
+    # min_coverage of the weight are left out.
+    if len(series) == 0:
+        return np.zeros(0)
+
+    years = np.unique(np.concatenate([s.years for s in series]))
+    growth = np.full((len(series), len(years)), np.nan)
+    for i, s in enumerate(series):
+        consecutive = np.diff(s.years) == 1
+        consecutive[:1] = False
+        rates = s.amounts[1:] / s.amounts[:-1] - 1
+        columns = np.searchsorted(years, s.years[1:][consecutive])
+        growth[i, columns] = rates[consecutive]
+
+    weights = np.asarray(weights, dtype=np.float64)
+    available_weights = weights[:, None] * ~np.isnan(growth)
+    total_weights = available_weights.sum(axis=0)
+
+    # Fall back to the best covered years when none reach min_coverage
+    coverage = total_weights / max(weights.sum(), 1e-12)
+    keep = (coverage >= min(min_coverage, coverage.max())) & (total_weights > 0)
+
+    weighted = np.nansum(np.nan_to_num(growth) * available_weights, axis=0)
+
+    return weighted[keep] / total_weights[keep]
+
+
+def simulate_income(
+    series: List[DividendSeries],
+    weights: np.ndarray,
+    dividend_yield: float,
+    invest_per_year: float,
+    years: int = 30,
+    paths: int = 10_000,
+    reinvest: bool = True,
+    percentiles: Sequence[float] = PERCENTILES,
+    seed: int = None,
+    workers: int = 1,
+    min_coverage: float = 0.5,
+) -> Dict[str, np.ndarray]:
+    # Bootstraps whole historic years, so every path keeps the way the
+    # tickers' dividends moved together, and returns the yearly income
+    # percentiles across all paths.
+    history = portfolio_growth_by_year(series, weights, min_coverage)
+
+    seeds = np.random.SeedSequence(seed).spawn(max(workers, 1))
+    if workers > 1:
+        chunks = [len(c) for c in np.array_split(np.arange(paths), workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            incomes = pool.map(
+                _simulate_paths,
+                [history] * workers,
+                [dividend_yield] * workers,
+                [invest_per_year] * workers,
+                [years] * workers,
+                chunks,
+                [reinvest] * workers,
+                seeds,
+            )
+            income = np.concatenate(list(incomes), axis=1)
+    else:
+        income = _simulate_paths(
+            history,
+            dividend_yield,
+            invest_per_year,
+            years,
+            paths,
+            reinvest,
+            seeds[0],
+        )
+
+    return {
+        "percentiles": np.asarray(percentiles),
+        "income": np.percentile(income, percentiles, axis=1),
+        "mean": income.mean(axis=1),
+    }
+
+
+def _simulate_paths(
+    history: np.ndarray,
+    dividend_yield: float,
+    invest_per_year: float,
+    years: int,
+    paths: int,
+    reinvest: bool,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+
+    if len(history) == 0:
+        growth = np.zeros((years, paths))
+    else:
+        growth = history[rng.integers(0, len(history), size=(years, paths))]
+
+    # Income from existing holdings grows with the dividends, new money and
+    # reinvested dividends buy more income at the current yield
+    growth += 1
+    if reinvest:
+        growth += dividend_yield
+
+    new_income = invest_per_year * dividend_yield
+    income = np.empty((years, paths))
+    income[0] = new_income
+    for year in range(1, years):
+        np.multiply(income[year - 1], growth[year], out=income[year])
+        income[year] += new_income
+
+    return income
@@ -0,0 +1,315 @@
+from typing import Any, Dict, Iterable, List
+from pathlib import Path
+import json
+import re
+import sqlite3
+import threading
+import os
+from deta import Deta
+
+
+DETA_BACKEND = "deta"
+LOCAL_BACKEND = "local"
+SQLITE_BACKEND = "sqlite"
+BACKENDS = (DETA_BACKEND, LOCAL_BACKEND, SQLITE_BACKEND)
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "./data/dividend-calculator.sqlite3")
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class LocalFetchResponse:
+    def __init__(self, items: List[dict]) -> None:
+        self.items = items
+        self.count = len(items)
+        self.last = None
+
+
+class LocalBase:
+    # In-memory stand-in for a Deta Base, for tests and benchmarks
+    def __init__(self) -> None:
+        self._items: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            item = self._items.get(key)
+            return None if item is None else dict(item)
+
+    def put(self, data: dict, key: str = None) -> dict:
+        item = {**data, "key": key}
+        with self._lock:
+            self._items[key] = item
+
+        return dict(item)
+
+    def put_many(self, items: List[dict]) -> Dict[str, List[dict]]:
+        return {"processed": {"items": [self.put(i, i.get("key")) for i in items]}}
+
+    def fetch(
+        self, query: Dict[str, Any] = None, limit: int = 1000, last: str = None
+    ) -> LocalFetchResponse:
+        # Everything is returned in one page, so limit and last are ignored
+        query = {} if query is None else query
+        with self._lock:
+            items = [
+                dict(item)
+                for item in self._items.values()
+                if all(item.get(k) == v for k, v in query.items())
+            ]
+
+        return LocalFetchResponse(items)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class SqliteFetchResponse(LocalFetchResponse):
+    def __init__(self, items: List[dict], last: str) -> None:
+        super().__init__(items)
+        self.last = last
+
+
+class SqliteConnections:
+    # One connection for writes, shared behind a lock, and one per thread for
+    # reads, so WAL lets reads run alongside each other and alongside writes
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.writer = self._connect()
+        self._local = threading.local()
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        return conn
+
+
+class SqliteBase:
+    # Deta Base API on a table of an embedded SQLite database, one JSON
+    # document per key. Fields declared by the caller are indexed with the
+    # table, other fields used in fetch queries get an index on first use.
+    def __init__(self, db: SqliteConnections, name: str, indexes: Iterable[str] = ()):
+        assert IDENTIFIER.match(name), f"Invalid base name {name}"
+        self.db = db
+        self.table = name
+        self._indexed = set()
+
+        with self.db.lock, self.db.writer:
+            self.db.writer.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+
+        self.ensure_indexes(indexes)
+
+    def get(self, key: str) -> dict:
+        row = (
+            self.db.reader()
+            .execute(f"SELECT data FROM {self.table} WHERE key = ?", (key,))
+            .fetchone()
+        )
+
+        return None if row is None else json.loads(row[0])
+
+    def put(self, data: dict, key: str = None) -> dict:
+        return self.put_many([{**data, "key": key}])["processed"]["items"][0]
+
+    def put_many(self, items: List[dict]) -> Dict[str, List[dict]]:
+        # Every item is written in a single transaction
+        rows = [(i["key"], json.dumps(i)) for i in items]
+        with self.db.lock, self.db.writer:
+            self.db.writer.executemany(
+                f"INSERT INTO {self.table} (key, data) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+                rows,
+            )
+
+        return {"processed": {"items": [dict(i) for i in items]}}
+
+    def fetch(
+        self, query: Dict[str, Any] = None, limit: int = 1000, last: str = None
+    ) -> SqliteFetchResponse:
+        # Equality on top-level fields, paged by key like Deta
+        query = {} if query is None else query
+
+        where, params = [], []
+        for field, value in query.items():
+            assert IDENTIFIER.match(field), f"Invalid query field {field}"
+            self.ensure_indexes([field])
+            where.append(f"json_extract(data, '$.{field}') = ?")
+            params.append(value)
+        if last is not None:
+            where.append("key > ?")
+            params.append(last)
+
+        sql = f"SELECT key, data FROM {self.table}"
+        if len(where) > 0:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY key LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self.db.reader().execute(sql, params).fetchall()
+
+        page = rows[:limit]
+        last = page[-1][0] if len(rows) > limit else None
+
+        return SqliteFetchResponse([json.loads(data) for _, data in page], last)
+
+    def delete(self, key: str) -> None:
+        with self.db.lock, self.db.writer:
+            self.db.writer.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def ensure_indexes(self, fields: Iterable[str]) -> None:
+        for field in fields:
+            if field in self._indexed:
+                continue
+
+            assert IDENTIFIER.match(field), f"Invalid index field {field}"
+            with self.db.lock, self.db.writer:
+                self.db.writer.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_{field} "
+                    f"ON {self.table} (json_extract(data, '$.{field}'))"
+                )
+            self._indexed.add(field)
+
+
+class LocalFile:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class LocalDrive:
+    # In-memory stand-in for a Deta Drive, for tests and benchmarks
+    def __init__(self) -> None:
+        self._files: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> LocalFile:
+        with self._lock:
+            data = self._files.get(name)
+
+        return None if data is None else LocalFile(data)
+
+    def put(self, name: str, data: Any = None) -> str:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        with self._lock:
+            self._files[name] = data
+
+        return name
+
+    def list(
+        self, limit: int = 1000, prefix: str = None, last: str = None
+    ) -> Dict[str, Any]:
+        with self._lock:
+            names = sorted(self._files.keys())
+
+        if prefix is not None:
+            names = [n for n in names if n.startswith(prefix)]
+        if last is not None:
+            names = [n for n in names if n > last]
+
+        page = names[:limit]
+        paging = {"size": len(page)}
+        if len(names) > limit:
+            paging["last"] = page[-1]
+
+        return {"names": page, "paging": paging}
+
+    def delete_many(self, names: List[str]) -> Dict[str, List[str]]:
+        with self._lock:
+            for name in names:
+                self._files.pop(name, None)
+
+        return {"deleted": names}
+
+
+_backend = os.getenv("STORAGE_BACKEND", DETA_BACKEND)
+_deta = None
+_sqlite: SqliteConnections = None
+_bases: Dict[str, Any] = {}
+_drives: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def use_backend(backend: str) -> None:
+    # Switching backends drops every client created so far
+    global _backend, _deta, _sqlite
+    assert backend in BACKENDS, f"Unknown backend {backend}"
+
+    with _lock:
+        _backend = backend
+        _deta = None
+        _sqlite = None
+        _bases.clear()
+        _drives.clear()
+
+
+def get_base(name: str, indexes: Iterable[str] = ()):
+    # indexes are the fields the caller queries on, only SQLite uses them
+    base = _bases.get(name)
+    if base is None:
+        with _lock:
+            if name not in _bases:
+                if _backend == LOCAL_BACKEND:
+                    _bases[name] = LocalBase()
+                elif _backend == SQLITE_BACKEND:
+                    _bases[name] = SqliteBase(_get_sqlite(), name, indexes)
+                else:
+                    _bases[name] = _get_deta().Base(name)
+
+            base = _bases[name]
+
+    if isinstance(base, SqliteBase):
+        base.ensure_indexes(indexes)
+
+    return base
+
+
+def get_drive(name: str):
+    drive = _drives.get(name)
+    if drive is not None:
+        return drive
+
+    with _lock:
+        if name not in _drives:
+            # The cache only uses Drive on Deta, so SQLite keeps files in memory
+            if _backend in (LOCAL_BACKEND, SQLITE_BACKEND):
+                _drives[name] = LocalDrive()
+            else:
+                _drives[name] = _get_deta().Drive(name)
+
+        return _drives[name]
+
+
+def _get_deta() -> Deta:
+    global _deta
+    if _deta is None:
+        _deta = Deta(os.getenv("DETA_PROJECT_KEY"))
+
+    return _deta
+
+
+def _get_sqlite() -> SqliteConnections:
+    # Shared by every base, so all writes go through the same lock
+    global _sqlite
+    if _sqlite is None:
+        _sqlite = SqliteConnections(SQLITE_PATH)
+
+    return _sqlite
@@ -1,373 +1,213 @@
-from typing import Dict
-from src.utils import safeget
-from src.yahoo_finance import YahooFinance
+from typing import Dict, Any, Iterable
+from src.yahoo_finance import (
+    YahooFinance,
+    shared_yahoo_finance,
+    TICKER_SNAPSHOT,
+    HISTORIC_DIVIDENDS,
+    HISTORIC_PRICES,
+)
+from src.ticker_snapshot import TickerSnapshot
+from src.dividend_series import DividendSeries
+from src import valuation
+from src import price_analytics
 from datetime import datetime
-from src.utils import calc_percentage_diff
+import numpy as np
+import pandas as pd
 
 
 class Ticker:
 
-    ticker_info = None
+    snapshot: TickerSnapshot = None
 
-    historic_prices = None
+    historic_prices: np.ndarray = None
 
     historic_dividends = None
 
+    dividend_series: DividendSeries = None
+
     def __init__(self, symbol: str, yahoo_finance: YahooFinance = None) -> None:
         self.symbol = symbol
-        self.yf = YahooFinance() if yahoo_finance is None else yahoo_finance
+        self.yf = shared_yahoo_finance() if yahoo_finance is None else yahoo_finance
 
-    def get_company_name(self) -> str:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "quoteType",
-            "shortName",
-        )
+    def warm(self, prefetched: Dict[str, Any]) -> Dict[str, Exception]:
+        errors = {k: v for k, v in prefetched.items() if isinstance(v, Exception)}
 
-    def get_dividend_yield(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "summaryDetail",
-            "trailingAnnualDividendYield",
-            "raw",
-        )
+        if TICKER_SNAPSHOT in prefetched and TICKER_SNAPSHOT not in errors:
+            self.snapshot = TickerSnapshot.from_dict(prefetched[TICKER_SNAPSHOT])
+
+        if HISTORIC_DIVIDENDS in prefetched and HISTORIC_DIVIDENDS not in errors:
+            self.historic_dividends = prefetched[HISTORIC_DIVIDENDS]
+            self.dividend_series = None
+
+        if HISTORIC_PRICES in prefetched and HISTORIC_PRICES not in errors:
+            self.historic_prices = prefetched[HISTORIC_PRICES]
+
+        return errors
+
+    def refresh(self) -> None:
+        # Drop the loaded data so the next getter call fetches it again
+        self.snapshot = None
+        self.historic_prices = None
+        self.historic_dividends = None
+        self.dividend_series = None
+
+    def is_warm(
+        self, kinds: Iterable[str] = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS)
+    ) -> bool:
+        loaded = {
+            TICKER_SNAPSHOT: self.snapshot,
+            HISTORIC_DIVIDENDS: self.historic_dividends,
+            HISTORIC_PRICES: self.historic_prices,
+        }
+
+        return all(loaded.get(kind) is not None for kind in kinds)
+
+    def get_snapshot(self) -> TickerSnapshot:
+        if self.snapshot is None:
+            self.snapshot = TickerSnapshot.from_dict(
+                self.yf.get_ticker_snapshot(self.symbol)
+            )
+
+        return self.snapshot
+
+    def get_company_name(self) -> str:
+        return self.get_snapshot().company_name
 
     def get_industry(self) -> str:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "assetProfile",
-            "industry",
-        )
+        return self.get_snapshot().industry
 
     def get_sector(self) -> str:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "assetProfile",
-            "sector",
-        )
+        return self.get_snapshot().sector
 
     def get_exchange_name(self) -> str:
-        return safeget(
-            self.ticker_info, "quoteSummary", "result", 0, "price", "exchange"
-        )
+        return self.get_snapshot().exchange
 
     def get_dividend_yield(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        div_yield = safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "summaryDetail",
-            "dividendYield",
-            "raw",
-        )
-
-        return div_yield if div_yield is not None else 0
+        return self.get_snapshot().dividend_yield
 
     def get_beta(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "defaultKeyStatistics",
-            "beta",
-            "raw",
-        )
+        return self.get_snapshot().beta
 
     def get_market_cap(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "summaryDetail",
-            "marketCap",
-            "raw",
-        )
+        return self.get_snapshot().market_cap
 
     def get_pe_ratio(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "summaryDetail",
-            "trailingPE",
-            "raw",
-        )
+        return self.get_snapshot().pe_ratio
 
     def get_debt_to_equity(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        res = safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "financialData",
-            "debtToEquity",
-            "raw",
-        )
-        return res / 100 if res is not None else None
+        return self.get_snapshot().debt_to_equity
 
     def get_eps_ratio(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "defaultKeyStatistics",
-            "trailingEps",
-            "raw",
-        )
+        return self.get_snapshot().eps_ratio
 
     def get_current_price(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        price = safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "price",
-            "regularMarketPrice",
-            "raw",
-        )
-
-        # Price for London stock exchange is calculated in penny
-        return price / 100 if self.get_exchange_name() == "LSE" else price
+        return self.get_snapshot().current_price
 
     def get_currency(self) -> str:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "summaryDetail",
-            "currency",
-        )
+        return self.get_snapshot().currency
 
     def get_yearly_ratios(self) -> list:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        statements = safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "cashflowStatementHistory",
-            "cashflowStatements",
-        )
-
-        return [
-            {
-                "date": safeget(sts, "endDate", "fmt"),
-                "year": datetime.fromtimestamp(safeget(sts, "endDate", "raw")).year,
-                "net_income": safeget(sts, "netIncome", "raw"),
-                "dividends_paid": abs(safeget(sts, "dividendsPaid", "raw")),
-                "payout_ratio": abs(safeget(sts, "dividendsPaid", "raw"))
-                / safeget(sts, "netIncome", "raw"),
-                "dividend_cover": safeget(sts, "netIncome", "raw")
-                / abs(safeget(sts, "dividendsPaid", "raw")),
-            }
-            for sts in statements
-        ]
+        return self.get_snapshot().yearly_ratios
 
     def current_year_div_per_share(self) -> float:
-        yearly_dividends = self.get_dividends_per_year()
-        dividend_growth = self.get_yearly_dividend_growth(5)
-        last_year_div_amount = list(yearly_dividends.values())[-1]
+        series = self.get_dividend_series()
+        dividend_growth = series.average_growth(5)
+        last_year_div_amount = series.last_amount()
 
         return last_year_div_amount + (last_year_div_amount * dividend_growth)
 
-    def get_dividends_per_year(self) -> Dict[int, float]:
-        if self.historic_dividends is None:
-            self.historic_dividends = self.yf.get_historic_dividends(self.symbol)
+    def get_historic_prices(self) -> np.ndarray:
+        # Monthly bars as a structured array with timestamp and OHLCV columns
+        if self.historic_prices is None:
+            self.historic_prices = self.yf.get_historic_prices(self.symbol)
 
-        current_year = datetime.now().year
-        dividends = {}
-        for d in self.historic_dividends:
-            dt = datetime.fromtimestamp(d["date"])
-            if dt.year == current_year:
-                continue
+        return self.historic_prices
 
-            if dt.year not in dividends:
-                dividends[dt.year] = 0
+    def get_price_frame(self) -> pd.DataFrame:
+        prices = self.get_historic_prices()
+        index = pd.to_datetime(prices["timestamp"], unit="s")
 
-            dividends[dt.year] += d["amount"]
-
-        return dividends
+        return pd.DataFrame(
+            {name: prices[name] for name in prices.dtype.names[1:]}, index=index
+        )
 
-    def get_yearly_dividend_growth(self, last_years: int = None) -> float:
-        dividends = list(self.get_dividends_per_year().values())
+    def get_price_analytics(self) -> Dict[str, Any]:
+        analytics = price_analytics.analyse_tickers(
+            [self.get_historic_prices()], [self.get_historic_dividends()]
+        )
 
-        if last_years is not None:
-            dividends = dividends[-last_years:]
-            initial = None
-            total_growth = 0
+        return {k: v if k == "months" else v[0] for k, v in analytics.items()}
 
-        for i, div in enumerate(dividends):
-            if i == 0:
-                initial = div
-                continue
+    def get_historic_dividends(self) -> list:
+        if self.historic_dividends is None:
+            self.historic_dividends = self.yf.get_historic_dividends(self.symbol)
 
-            total_growth += calc_percentage_diff(initial, div)
+        return self.historic_dividends
 
-            initial = div
+    def get_dividend_series(self) -> DividendSeries:
+        if self.dividend_series is None:
+            # The current year is still in progress so it is left out
+            self.dividend_series = DividendSeries.from_events(
+                self.get_historic_dividends(), exclude_year=datetime.now().year
+            )
 
-        return round(total_growth / len(dividends), 4)
+        return self.dividend_series
 
-    def get_trailing_average_div_yield(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        trailing_div_yield = safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "summaryDetail",
-            "fiveYearAvgDividendYield",
-            "raw",
-        )
+    def get_dividends_per_year(self) -> Dict[int, float]:
+        return self.get_dividend_series().per_year
 
-        if trailing_div_yield is None:
-            return 0
+    def get_yearly_dividend_growth(self, last_years: int = None) -> float:
+        return self.get_dividend_series().average_growth(last_years)
 
-        return float(trailing_div_yield) / 100
+    def get_trailing_average_div_yield(self) -> float:
+        return self.get_snapshot().trailing_average_div_yield
 
     def get_cadi(self) -> int:
-        divs = list(self.get_dividends_per_year().values())
-        divs.reverse()
-        cadi = 0
-
-        for i in range(len(divs)):
-            cadi += 1
-
-            if i + 1 == len(divs):
-                break
-
-            if divs[i] < divs[i + 1]:
-                break
-
-        return cadi
+        return self.get_dividend_series().cadi
 
     def get_peg_ratio(self) -> float:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "defaultKeyStatistics",
-            "pegRatio",
-            "raw",
-        )
+        return self.get_snapshot().peg_ratio
 
     def get_ex_dividend_date(self, fmt: bool = False) -> int:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "calendarEvents",
-            "exDividendDate",
-            "fmt" if fmt else "raw",
-        )
+        snapshot = self.get_snapshot()
+
+        return snapshot.ex_dividend_date_fmt if fmt else snapshot.ex_dividend_date
 
     def get_next_dividend_date(self, fmt: bool = False) -> int:
-        if self.ticker_info is None:
-            self.ticker_info = self.yf.get_ticker_info(self.symbol)
-
-        return safeget(
-            self.ticker_info,
-            "quoteSummary",
-            "result",
-            0,
-            "calendarEvents",
-            "dividendDate",
-            "fmt" if fmt else "raw",
-        )
+        snapshot = self.get_snapshot()
+
+        return snapshot.dividend_date_fmt if fmt else snapshot.dividend_date
 
     def dividend_discount_model(self, ror: float = 0.1) -> float:
-        current_dividend = self.get_dividend_yield() * self.get_current_price() / 100
-        return current_dividend / (ror - self.get_yearly_dividend_growth(10))
+        dividend = valuation.current_dividend(
+            self.get_dividend_yield(), self.get_current_price()
+        )
+        growth = self.get_yearly_dividend_growth(10)
+
+        return float(valuation.dividend_discount_model(dividend, growth, ror)[0, 0])
 
     def dividend_discount_model_v2(
         self, ror: float = 0.1, hold_years: int = 10
     ) -> float:
-        current_dividend = self.get_dividend_yield() * self.get_current_price() / 100
-        discounted_dividends = []
-        for i in range(hold_years):
-            # print(i)
-            cv = current_dividend + (current_dividend * i) / (1 + ror) ** i
-            discounted_dividends.append(cv)
-
-        selling_price = self.get_current_price() / 100 + (
-            self.get_current_price() / 100 * ror
+        price = self.get_current_price()
+        dividend = valuation.current_dividend(self.get_dividend_yield(), price)
+
+        return float(
+            valuation.dividend_discount_model_v2(dividend, price, ror, hold_years)[0, 0]
         )
-        discounted_selling_price = selling_price / (1 + ror) ** hold_years
-        return sum(discounted_dividends) + discounted_selling_price
 
     def ratios_valuation_model(self) -> float:
         peg = self.get_peg_ratio()
         if peg is None:
             return None
 
-        peg = peg / 100
+        value = float(
+            valuation.ratios_valuation_model(
+                self.get_eps_ratio(), self.get_pe_ratio(), peg
+            )
+        )
 
-        return self.get_eps_ratio() * (1 + peg) * self.get_pe_ratio()
+        return None if np.isnan(value) else value
 
 
 if __name__ == "__main__":
@@ -0,0 +1,26 @@
+from typing import Dict, List, Iterable
+import threading
+from src.ticker import Ticker
+from src.yahoo_finance import YahooFinance
+
+
+class TickerRegistry:
+    # Identity map handing back the same Ticker for a symbol, so the data a
+    # Ticker loads is shared by every portfolio that holds it.
+    def __init__(self, yahoo_finance: YahooFinance = None) -> None:
+        self.yf = yahoo_finance
+        self._tickers: Dict[str, Ticker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str) -> Ticker:
+        with self._lock:
+            if symbol not in self._tickers:
+                self._tickers[symbol] = Ticker(symbol, self.yf)
+
+            return self._tickers[symbol]
+
+    def get_many(self, symbols: Iterable[str]) -> List[Ticker]:
+        return [self.get(s) for s in symbols]
+
+    def __len__(self) -> int:
+        return len(self._tickers)
@@ -0,0 +1,145 @@
+from typing import List, Dict, Any, Tuple
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from src.utils import safeget
+
+
+# Where each snapshot field lives in a quoteSummary result. The first key of
+# every path is the quoteSummary module, so this registry also decides which
+# modules need to be requested from Yahoo.
+FIELDS: Dict[str, Tuple[str, ...]] = {
+    "company_name": ("quoteType", "shortName"),
+    "industry": ("assetProfile", "industry"),
+    "sector": ("assetProfile", "sector"),
+    "exchange": ("price", "exchange"),
+    "currency": ("summaryDetail", "currency"),
+    "dividend_yield": ("summaryDetail", "dividendYield", "raw"),
+    "trailing_average_div_yield": (
+        "summaryDetail",
+        "fiveYearAvgDividendYield",
+        "raw",
+    ),
+    "current_price": ("price", "regularMarketPrice", "raw"),
+    "beta": ("defaultKeyStatistics", "beta", "raw"),
+    "market_cap": ("summaryDetail", "marketCap", "raw"),
+    "pe_ratio": ("summaryDetail", "trailingPE", "raw"),
+    "eps_ratio": ("defaultKeyStatistics", "trailingEps", "raw"),
+    "peg_ratio": ("defaultKeyStatistics", "pegRatio", "raw"),
+    "debt_to_equity": ("financialData", "debtToEquity", "raw"),
+    "ex_dividend_date": ("calendarEvents", "exDividendDate", "raw"),
+    "ex_dividend_date_fmt": ("calendarEvents", "exDividendDate", "fmt"),
+    "dividend_date": ("calendarEvents", "dividendDate", "raw"),
+    "dividend_date_fmt": ("calendarEvents", "dividendDate", "fmt"),
+    "yearly_ratios": ("cashflowStatementHistory", "cashflowStatements"),
+}
+
+SNAPSHOT_MODULES = sorted({path[0] for path in FIELDS.values()})
+
+
+@dataclass
+class TickerSnapshot:
+    # Only the fields the app reads from the quoteSummary payload, extracted
+    # once per fetch so the raw JSON never has to be kept around.
+    __slots__ = (
+        "symbol",
+        "company_name",
+        "industry",
+        "sector",
+        "exchange",
+        "currency",
+        "dividend_yield",
+        "trailing_average_div_yield",
+        "current_price",
+        "beta",
+        "market_cap",
+        "pe_ratio",
+        "eps_ratio",
+        "peg_ratio",
+        "debt_to_equity",
+        "ex_dividend_date",
+        "ex_dividend_date_fmt",
+        "dividend_date",
+        "dividend_date_fmt",
+        "yearly_ratios",
+    )
+
+    symbol: str
+    company_name: str
+    industry: str
+    sector: str
+    exchange: str
+    currency: str
+    dividend_yield: float
+    trailing_average_div_yield: float
+    current_price: float
+    beta: float
+    market_cap: float
+    pe_ratio: float
+    eps_ratio: float
+    peg_ratio: float
+    debt_to_equity: float
+    ex_dividend_date: int
+    ex_dividend_date_fmt: str
+    dividend_date: int
+    dividend_date_fmt: str
+    yearly_ratios: List[Dict[str, Any]]
+
+    @classmethod
+    def from_quote_summary(cls, symbol: str, ticker_info: dict) -> "TickerSnapshot":
+        result = safeget(ticker_info, "quoteSummary", "result", 0)
+        assert result is not None, f"No quote summary for {symbol}"
+
+        fields = {name: safeget(result, *path) for name, path in FIELDS.items()}
+
+        # Price for London stock exchange is calculated in penny
+        if fields["current_price"] is not None and fields["exchange"] == "LSE":
+            fields["current_price"] = fields["current_price"] / 100
+
+        if fields["dividend_yield"] is None:
+            fields["dividend_yield"] = 0
+
+        if fields["trailing_average_div_yield"] is None:
+            fields["trailing_average_div_yield"] = 0
+        else:
+            fields["trailing_average_div_yield"] = (
+                float(fields["trailing_average_div_yield"]) / 100
+            )
+
+        if fields["debt_to_equity"] is not None:
+            fields["debt_to_equity"] = fields["debt_to_equity"] / 100
+
+        fields["yearly_ratios"] = extract_yearly_ratios(fields["yearly_ratios"])
+
+        return cls(symbol=symbol, **fields)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TickerSnapshot":
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def extract_yearly_ratios(statements: List[dict]) -> List[Dict[str, Any]]:
+    if statements is None:
+        return []
+
+    ratios = []
+    for sts in statements:
+        net_income = safeget(sts, "netIncome", "raw")
+        dividends_paid = safeget(sts, "dividendsPaid", "raw")
+        if not net_income or not dividends_paid:
+            continue
+
+        ratios.append(
+            {
+                "date": safeget(sts, "endDate", "fmt"),
+                "year": datetime.fromtimestamp(safeget(sts, "endDate", "raw")).year,
+                "net_income": net_income,
+                "dividends_paid": abs(dividends_paid),
+                "payout_ratio": abs(dividends_paid) / net_income,
+                "dividend_cover": net_income / abs(dividends_paid),
+            }
+        )
+
+    return ratios
@@ -0,0 +1,116 @@
+from typing import List, Dict, Any
+from pathlib import Path
+import json
+import os
+import threading
+import time
+from urllib.parse import quote
+from src.utils import write_atomic
+
+
+class TimeSeriesStore:
+    # Append-only JSON lines file per key. Rows are merged by their time
+    # field on read, a later row replaces an earlier one with the same time.
+    def __init__(self, root: str, time_field: str) -> None:
+        self.root = Path(root)
+        self.time_field = time_field
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> List[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.is_file():
+            return []
+
+        with self._lock:
+            with open(path, "r") as file:
+                lines = file.readlines()
+
+        rows = {}
+        for line in lines:
+            line = line.strip()
+            if line == "":
+                continue
+
+            row = json.loads(line)
+            rows[row[self.time_field]] = row
+
+        # Rewrite the file once superseded rows make up most of it
+        if len(lines) > 2 * len(rows):
+            self._write(key, list(rows.values()), "w")
+
+        return sorted(rows.values(), key=lambda r: r[self.time_field])
+
+    def last_time(self, rows: List[Dict[str, Any]]) -> int:
+        return rows[-1][self.time_field] if len(rows) > 0 else None
+
+    def append(self, key: str, rows: List[Dict[str, Any]]) -> None:
+        if len(rows) == 0:
+            return
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._write(key, rows, "a")
+
+    def merge(
+        self, key: str, rows: List[Dict[str, Any]], new_rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        # The fetched window replaces every stored row from its first one on,
+        # even rows it has no exact match for, and the merged series is returned
+        if len(new_rows) == 0:
+            return rows
+
+        start = min(r[self.time_field] for r in new_rows)
+        fetched = {r[self.time_field] for r in new_rows}
+        kept = [r for r in rows if r[self.time_field] < start]
+        merged = sorted(kept + new_rows, key=lambda r: r[self.time_field])
+
+        # Appending is enough when every replaced row is superseded on load
+        if all(r[self.time_field] in fetched for r in rows[len(kept) :]):
+            self.append(key, new_rows)
+        else:
+            self._write(key, merged, "w")
+
+        return merged
+
+    def replace(self, key: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Rewrite the whole series from a full fetch and remember when
+        self.root.mkdir(parents=True, exist_ok=True)
+        rows = sorted(rows, key=lambda r: r[self.time_field])
+        self._write(key, rows, "w")
+        self._synced_path(key).touch()
+
+        return rows
+
+    def synced_age(self, key: str) -> float:
+        # Seconds since the series was last replaced by a full fetch
+        path = self._synced_path(key)
+        if not path.is_file():
+            return None
+
+        return time.time() - path.stat().st_mtime
+
+    def _write(self, key: str, rows: List[Dict[str, Any]], mode: str) -> None:
+        content = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+        with self._lock:
+            # A rewrite replaces the file in one go so readers never see it empty
+            if mode == "w":
+                write_atomic(self._path(key), content)
+                return
+
+            with open(self._path(key), mode) as file:
+                file.write(content)
+
+    def _path(self, key: str) -> Path:
+        # Keys are symbols, escape them so one can never name a path elsewhere
+        return self.root / f"{quote(key, safe='')}.jsonl"
+
+    def _synced_path(self, key: str) -> Path:
+        return self.root / f"{quote(key, safe='')}.synced"
+
+
+# Deta only allows writing to /tmp
+TIMESERIES_DIR = os.getenv(
+    "TIMESERIES_DIR",
+    "/tmp/timeseries" if os.getenv("DETA_PROJECT_KEY") else "./cache/timeseries",
+)
+
+dividends_store = TimeSeriesStore(f"{TIMESERIES_DIR}/dividends", "date")
@@ -1,6 +1,5 @@
-import os
-from deta import Deta
 from flask_login import UserMixin
+from src.storage import get_base
 
 
 class User(UserMixin):
@@ -12,8 +11,7 @@ class User(UserMixin):
 
     @staticmethod
     def get(id: str):
-        users_table = Deta(os.getenv("DETA_PROJECT_KEY")).Base("users")
-        item = users_table.get(id)
+        item = get_base("users").get(id)
         if item is None:
             return None
 
@@ -21,8 +19,7 @@ class User(UserMixin):
 
     @staticmethod
     def create(id: str, name: str, email: str, profile_pic: str):
-        users_table = Deta(os.getenv("DETA_PROJECT_KEY")).Base("users")
-        users_table.put(
+        get_base("users").put(
             data={
                 "name": name,
                 "email": email,
@@ -1,11 +1,21 @@
-from typing import List
+from typing import List, Dict, Tuple, Union
 from pathlib import Path
+import hashlib
+import inspect
 import json
+import math
+import re
 import time
 import os
-from deta import Drive
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from currency_converter import CurrencyConverter, SINGLE_DAY_ECB_URL
 from datetime import datetime
+from urllib.parse import quote, unquote
+from src.memory_cache import memory_cache
+from src.storage import get_drive
+from src.serializer import serializer
+from src.cache_index import cache_index
 
 # TODO: Update SSL cert for currency converter
 # cc = CurrencyConverter(SINGLE_DAY_ECB_URL)
@@ -13,6 +23,12 @@ from datetime import datetime
 
 DETA_DRIVER_NAME = "dividend-calculator"
 
+# Part of every cache key, bump it to stop reading entries in an old layout
+CACHE_SCHEMA_VERSION = 2
+
+# Local cache files beyond this are evicted least recently used first
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_MB", "512")) * 1024 * 1024
+
 
 def safeget(dct: dict, *keys):
     for key in keys:
@@ -23,73 +39,230 @@ def safeget(dct: dict, *keys):
     return dct
 
 
-def calc_percentage_diff(initial: float, current: float) -> float:
-    return abs(initial - current) / current
+def write_atomic(path: Path, content: Union[str, bytes]) -> None:
+    # Readers see either the old file or the new one, never a partial write
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    with open(tmp_path, "wb" if isinstance(content, bytes) else "w") as file:
+        file.write(content)
 
+    os.replace(tmp_path, path)
 
-def cache_factory(cache_dir: str, file_prefix: str, ttl_sec: int):
-    def cache(func):
-        def wrapper(*args, **kwargs):
-
-            args_params = [str(argv) for argv in args[1:]]
-            kwargs_params = [str(argv) for argv in list(kwargs.values())]
 
-            file_sufix = "_".join(args_params + kwargs_params)
+def calc_percentage_diff(initial: float, current: float) -> float:
+    return abs(initial - current) / current
 
-            Path(cache_dir).mkdir(parents=True, exist_ok=True)
 
-            cache_file_path = Path(f"{cache_dir}/{file_prefix}_{file_sufix}.json")
+# Background workers refreshing stale cache entries, one refresh per key at a time
+_refresh_pool = ThreadPoolExecutor(max_workers=4)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Fetches from source in progress, concurrent misses on a key wait for the same one
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def single_flight(key: str, func, *args, **kwargs):
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = Future()
+
+    if not leader:
+        return call.result()
+
+    # Followers are released whatever the leader raises, even a BaseException
+    result, error = None, None
+    try:
+        result = func(*args, **kwargs)
+        return result
+    except BaseException as err:
+        error = err
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+        if error is None:
+            call.set_result(result)
+        else:
+            call.set_exception(error)
+
+
+def refresh_in_background(key: str, func, *args, **kwargs) -> None:
+    # At most one refresh per key is queued or running at a time
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            func(*args, **kwargs)
+        except Exception as err:
+            print(f"Failed to refresh {key}: {err}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    _refresh_pool.submit(run)
+
+
+def cache_factory(
+    cache_dir: str,
+    file_prefix: str,
+    ttl_sec: int,
+    stale_while_revalidate: bool = True,
+    max_stale_sec: int = 60 * 60 * 24 * 7,
+):
+    def cache(func):
+        signature = inspect.signature(func)
 
-            # Check if this is running on Deta
-            project_key = os.getenv("DETA_PROJECT_KEY")
-            deta_file = f"{file_prefix}_{file_sufix}.json"
-            if project_key is not None:
-                drive = Drive(DETA_DRIVER_NAME)
-                file = drive.get(deta_file)
-                if file is not None:
-                    print(f"Fetching {deta_file} from cache.")
-                    return json.loads(file.read())
+        def get_cache_key(args, kwargs) -> Tuple[str, str]:
+            # Defaults are bound first, so leaving an argument out or passing
+            # its default gives the same entry. The first argument after self
+            # is kept readable in the name, it is the symbol for every user.
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = list(bound.arguments.items())[1:]
 
-            if cache_file_path.is_file():
+            canonical = json.dumps(
+                [CACHE_SCHEMA_VERSION, file_prefix, params], sort_keys=True, default=str
+            )
+            digest = hashlib.sha1(canonical.encode()).hexdigest()[:16]
+            label = str(params[0][1]) if len(params) > 0 else ""
 
-                now = int(time.time())
-                created_at = int(cache_file_path.stat().st_mtime)
+            return f"{file_prefix}_{quote(label, safe='')[:64]}.{digest}", label
 
-                if now < created_at + ttl_sec:
-                    # print("Get data from cache")
-                    with open(cache_file_path, "r") as file:
-                        return json.loads(file.read())
+        def refresh(*args, **kwargs):
+            # Fetch from source and overwrite every cache tier
+            cache_key, label = get_cache_key(args, kwargs)
+            cache_file_path = Path(f"{cache_dir}/{cache_key}.json")
 
             # print("Get data from source")
             print(f"Fetching {cache_file_path} from source")
             result = func(*args, **kwargs)
 
+            created_at = time.time()
+            content, size = serializer.dumps(result, created_at)
+
             # Check if this is running on Deta
-            if project_key is not None:
-                drive = Drive(DETA_DRIVER_NAME)
-                drive.put(deta_file, data=json.dumps(result))
+            if os.getenv("DETA_PROJECT_KEY") is not None:
+                get_drive(DETA_DRIVER_NAME).put(f"{cache_key}.json", data=content)
+                memory_cache.put(cache_key, result, size, created_at + ttl_sec)
 
                 return result
 
-            with open(cache_file_path, "w") as file:
-                file.write(json.dumps(result, indent=4, ensure_ascii=False))
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            write_atomic(cache_file_path, content)
+
+            cache_index.record(
+                cache_key,
+                file_prefix,
+                label,
+                str(cache_file_path),
+                len(content),
+                created_at,
+                ttl_sec,
+            )
+            cache_index.evict(CACHE_MAX_BYTES)
+
+            memory_cache.put(cache_key, result, size, created_at + ttl_sec)
 
             return result
 
+        def shared_refresh(*args, **kwargs):
+            # A refresh racing a miss on the same key joins its fetch
+            cache_key, _ = get_cache_key(args, kwargs)
+
+            return single_flight(cache_key, refresh, *args, **kwargs)
+
+        def wrapper(*args, **kwargs):
+
+            cache_key, _ = get_cache_key(args, kwargs)
+
+            # Serve repeated reads from memory without touching disk or Drive
+            result = memory_cache.get(cache_key)
+            if result is not None:
+                cache_index.touch(cache_key)
+                return result
+
+            # Drive on Deta, the local file otherwise. Both tiers go by the
+            # time the entry was written, so neither serves it forever.
+            entry = None
+            if os.getenv("DETA_PROJECT_KEY") is not None:
+                file = get_drive(DETA_DRIVER_NAME).get(f"{cache_key}.json")
+                if file is not None:
+                    print(f"Fetching {cache_key}.json from cache.")
+                    entry = serializer.loads(file.read())
+
+                    # Entries that do not record their age count as expired
+                    created_at = entry.created_at or 0
+
+            # Local files are looked up in the index, so a missing file or one
+            # too old to be served is never touched
+            now = time.time()
+            indexed = None if entry is not None else cache_index.get(cache_key)
+            if indexed is not None:
+                created_at = indexed["created_at"]
+                max_age = max_stale_sec if stale_while_revalidate else ttl_sec
+                if now < created_at + max_age:
+                    try:
+                        with open(indexed["path"], "rb") as file:
+                            entry = serializer.loads(file.read())
+                        cache_index.touch(cache_key)
+                    except FileNotFoundError:
+                        entry = None
+
+            if entry is not None:
+                if now < created_at + ttl_sec:
+                    memory_cache.put(
+                        cache_key, entry.value, entry.size, created_at + ttl_sec
+                    )
+                    return entry.value
+
+                # Serve the expired entry right away and refresh it behind
+                # the scenes, unless it is too old to be useful
+                if stale_while_revalidate and now < created_at + max_stale_sec:
+                    refresh_in_background(cache_key, shared_refresh, *args, **kwargs)
+                    return entry.value
+
+            return shared_refresh(*args, **kwargs)
+
+        wrapper.refresh = shared_refresh
+
         return wrapper
 
     return cache
 
 
-def clear_deta_cache():
-    drive = Drive(DETA_DRIVER_NAME)
+def list_cached(cache_dir: str, file_prefix: str) -> List[str]:
+    # The readable part of the cache keys stored for a prefix, for a symbol
+    # cache it is the symbol
+    if os.getenv("DETA_PROJECT_KEY") is None:
+        return cache_index.labels(file_prefix)
 
-    files = drive.list()
-    if files is None:
-        return
+    prefix = f"{file_prefix}_"
+    drive = get_drive(DETA_DRIVER_NAME)
+    names = []
+    last = None
+    while True:
+        files = drive.list(prefix=prefix, last=last)
+        if files is None:
+            break
 
-    drive.delete_many(files["names"])
-    print("deleted all files in cache")
+        names += files["names"]
+        last = safeget(files, "paging", "last")
+        if last is None:
+            break
+
+    # Names from before the current key scheme have no digest and are skipped
+    pattern = re.compile(rf"^{re.escape(prefix)}(.*)\.[0-9a-f]{{16}}\.json$")
+    labels = [unquote(m.group(1)) for m in map(pattern.match, names) if m]
+
+    return list(dict.fromkeys(labels))
 
 
 def growth_in_percentage(data: List[float]) -> List[float]:
@@ -111,6 +284,11 @@ def to_GBP(amount: float, from_currency: str) -> float:
     # return cc.convert(amount, from_currency, "GBP")
 
 
+def nan_to_none(value: float) -> float:
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
 def to_percentage(value: float) -> str:
     return f"{round(value * 100, 2)}%"
 
@@ -0,0 +1,64 @@
+from typing import Union
+import numpy as np
+
+
+ArrayLike = Union[float, int, np.ndarray, list]
+
+
+def _columns(values: ArrayLike) -> np.ndarray:
+    # Per ticker inputs as a column so they broadcast against a row of rates
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))[:, None]
+
+
+def _rows(values: ArrayLike) -> np.ndarray:
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))[None, :]
+
+
+def current_dividend(dividend_yield: ArrayLike, price: ArrayLike) -> np.ndarray:
+    return (
+        np.asarray(dividend_yield, dtype=np.float64)
+        * np.asarray(price, dtype=np.float64)
+        / 100
+    )
+
+
+def dividend_discount_model(
+    dividend: ArrayLike, growth: ArrayLike, ror: ArrayLike
+) -> np.ndarray:
+    # Intrinsic value matrix with a row per ticker and a column per rate of return
+    return _columns(dividend) / (_rows(ror) - _columns(growth))
+
+
+def dividend_discount_model_v2(
+    dividend: ArrayLike, price: ArrayLike, ror: ArrayLike, hold_years: ArrayLike = 10
+) -> np.ndarray:
+    dividend = _columns(dividend)
+    price = _columns(price)
+    ror = _rows(ror)
+    hold_years = np.atleast_1d(np.asarray(hold_years, dtype=np.int64))
+    hold_years = np.broadcast_to(hold_years, (dividend.shape[0],))
+
+    # Axis 0 is the ticker, 1 the rate of return and 2 the holding year
+    years = np.arange(int(hold_years.max()) if len(hold_years) > 0 else 0)
+    held = years[None, None, :] < hold_years[:, None, None]
+    discounted = (
+        dividend[..., None]
+        + (dividend[..., None] * years) / (1 + ror[..., None]) ** years
+    )
+    discounted_dividends = np.where(held, discounted, 0).sum(axis=2)
+
+    selling_price = price / 100 + (price / 100 * ror)
+    discounted_selling_price = selling_price / (1 + ror) ** hold_years[:, None]
+
+    return discounted_dividends + discounted_selling_price
+
+
+def ratios_valuation_model(eps: ArrayLike, pe: ArrayLike, peg: ArrayLike) -> np.ndarray:
+    # NaN wherever one of the ratios is missing
+    eps, pe, peg = (np.asarray(v, dtype=np.float64) for v in (eps, pe, peg))
+
+    return eps * (1 + peg / 100) * pe
+
+
+def undervalued(price: ArrayLike, intrinsic_values: np.ndarray) -> np.ndarray:
+    return _columns(price) < intrinsic_values
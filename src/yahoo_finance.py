@@ -1,20 +1,175 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Callable
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import functools
+import numpy as np
 import requests as re
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 from datetime import datetime
 from src.utils import (
     cache_factory,
+    list_cached,
+    refresh_in_background,
     safeget,
+    single_flight,
     to_GBP,
 )
+from src.ticker_snapshot import TickerSnapshot, SNAPSHOT_MODULES
+from src.memory_cache import memory_cache
+from src.timeseries_store import dividends_store, TIMESERIES_DIR
+from src.price_store import PriceStore, PRICE_DTYPE
+
+TICKER_INFO = "info"
+TICKER_SNAPSHOT = "snapshot"
+HISTORIC_DIVIDENDS = "dividends"
+HISTORIC_PRICES = "prices"
+
+MINIMAL_PROFILE = "minimal"
+FULL_PROFILE = "full"
+
+PROFILE_MODULES = {
+    # Only the modules the snapshot fields are read from
+    MINIMAL_PROFILE: SNAPSHOT_MODULES,
+    FULL_PROFILE: [
+        "assetProfile",
+        "balanceSheetHistory",
+        "balanceSheetHistoryQuarterly",
+        "calendarEvents",
+        "cashflowStatementHistory",
+        "cashflowStatementHistoryQuarterly",
+        "defaultKeyStatistics",
+        "earnings",
+        "earningsHistory",
+        "earningsTrend",
+        "financialData",
+        "fundOwnership",
+        "incomeStatementHistory",
+        "incomeStatementHistoryQuarterly",
+        "indexTrend",
+        "industryTrend",
+        "insiderHolders",
+        "insiderTransactions",
+        "institutionOwnership",
+        "majorDirectHolders",
+        "majorHoldersBreakdown",
+        "netSharePurchaseActivity",
+        "price",
+        "quoteType",
+        "recommendationTrend",
+        "secFilings",
+        "sectorTrend",
+        "summaryDetail",
+        "summaryProfile",
+        "symbol",
+        "upgradeDowngradeHistory",
+        "fundProfile",
+        "topHoldings",
+        "fundPerformance",
+    ],
+}
+
+prices_store = PriceStore(f"{TIMESERIES_DIR}/prices")
+
+# Stored histories are downloaded in full again after this long
+RESYNC_SEC = 60 * 60 * 24 * 7
+
+# Stored prices are updated in the background once older than this
+PRICES_MAX_AGE_SEC = 60 * 60 * 24
+
+
+def chart_has_splits(body: dict) -> bool:
+    return len(safeget(body, "events", "splits") or {}) > 0
+
+
+def chart_dividends(body: dict) -> List[dict]:
+    raw = safeget(body, "events", "dividends")
+    if raw is None:
+        return []
+
+    currency = safeget(body, "meta", "currency")
+
+    def format_dividend(div: dict) -> dict:
+        amount = safeget(div, "amount")
+
+        return {
+            **div,
+            "datetime": datetime.fromtimestamp(div["date"]).strftime("%d-%m-%Y"),
+            "amount": to_GBP(amount, currency),
+        }
+
+    return [format_dividend(div) for div in list(raw.values())]
+
+
+def chart_prices(body: dict) -> np.ndarray:
+    timestamps = body.get("timestamp", [])
+    quote = safeget(body, "indicators", "quote", 0) or {}
+    currency = safeget(body, "meta", "currency")
+
+    prices = np.empty(len(timestamps), dtype=PRICE_DTYPE)
+    prices["timestamp"] = timestamps
+    for field in PRICE_DTYPE.names[1:]:
+        # Missing values come back as null and become NaN
+        values = quote.get(field) or [None] * len(timestamps)
+        prices[field] = np.array(values, dtype=np.float64)
+
+        # Keep prices in the same unit as the dividends
+        if field != "volume":
+            prices[field] = to_GBP(prices[field], currency)
+
+    return prices
 
 
 class YahooFinance:
+    def __init__(
+        self,
+        max_workers: int = 8,
+        pool_size: int = 10,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+    ) -> None:
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        # Keep-alive connections to the Yahoo hosts, retried on rate limits
+        # and server errors with exponential backoff
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+
+        self.session = re.Session()
+        self.session.headers.update(
+            {"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64)"}
+        )
+        self.session.mount("https://", adapter)
+
     @cache_factory("./cache", "ticker", 60 * 60 * 24)
-    def get_ticker_info(self, symbol: str) -> dict:
-        res = re.get(
-            f"https://query2.finance.yahoo.com/v10/finance/quoteSummary/{symbol}?modules=assetProfile,balanceSheetHistory,balanceSheetHistoryQuarterly,calendarEvents,cashflowStatementHistory,cashflowStatementHistoryQuarterly,defaultKeyStatistics,earnings,earningsHistory,earningsTrend,financialData,fundOwnership,incomeStatementHistory,incomeStatementHistoryQuarterly,indexTrend,industryTrend,insiderHolders,insiderTransactions,institutionOwnership,majorDirectHolders,majorHoldersBreakdown,netSharePurchaseActivity,price,quoteType,recommendationTrend,secFilings,sectorTrend,summaryDetail,summaryProfile,symbol,upgradeDowngradeHistory,fundProfile,topHoldings,fundPerformance",
-            headers={"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64)"},
+    def get_ticker_info(self, symbol: str, profile: str = MINIMAL_PROFILE) -> dict:
+        return self.fetch_ticker_info(symbol, profile)
+
+    @cache_factory("./cache", "snapshot", 60 * 60 * 24)
+    def get_ticker_snapshot(self, symbol: str) -> dict:
+        # Only the compact snapshot gets cached, the raw payload is dropped
+        info = self.fetch_ticker_info(symbol, MINIMAL_PROFILE)
+
+        return TickerSnapshot.from_quote_summary(symbol, info).to_dict()
+
+    def fetch_ticker_info(self, symbol: str, profile: str = MINIMAL_PROFILE) -> dict:
+        assert profile in PROFILE_MODULES, f"Unknown profile {profile}"
+
+        url = "https://query2.finance.yahoo.com/v10/finance/quoteSummary/{symbol}?modules={modules}"
+        res = self.session.get(
+            url.format(symbol=symbol, modules=",".join(PROFILE_MODULES[profile])),
+            timeout=self.timeout,
         )
 
         assert res.status_code == 200, f"Status code is {res.status_code}"
@@ -23,36 +178,113 @@ class YahooFinance:
 
     @cache_factory("./cache", "dividends", 60 * 60 * 24)
     def get_historic_dividends(self, symbol: str) -> dict:
-        url = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?period1=0&period2={timestamp}&interval={interval}&events=div"
-        res = re.get(
-            url.format(symbol=symbol, timestamp=int(time.time()), interval="1mo"),
-            headers={"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64)"},
-        )
+        # Only the window since the last stored dividend is downloaded. Yahoo
+        # adjusts amounts for splits, so a split in the window or a week
+        # since the last full download means everything is downloaded again.
+        rows = dividends_store.load(symbol)
+        last = dividends_store.last_time(rows)
+        synced_age = dividends_store.synced_age(symbol)
 
-        assert res.status_code == 200, f"Status code is {res.status_code}"
+        if last is not None and synced_age is not None and synced_age < RESYNC_SEC:
+            body = self.fetch_chart(symbol, "1mo", last, events="div,split")
+            if not chart_has_splits(body):
+                dividends = dividends_store.merge(symbol, rows, chart_dividends(body))
+                assert len(dividends) > 0, f"Company {symbol} is not paying dividends"
 
-        body = res.json()
-        raw = safeget(body, "chart", "result", 0, "events", "dividends")
-        assert raw is not None, f"Company {symbol} is not paying dividends"
+                return dividends
 
-        def format_dividend(div: dict) -> dict:
-            currency = safeget(body, "chart", "result", 0, "meta", "currency")
-            amount = safeget(div, "amount")
+        dividends = dividends_store.replace(symbol, self.fetch_dividends(symbol))
+        assert len(dividends) > 0, f"Company {symbol} is not paying dividends"
 
-            return {
-                **div,
-                "datetime": datetime.fromtimestamp(div["date"]).strftime("%d-%m-%Y"),
-                "amount": to_GBP(amount, currency),
-            }
+        return dividends
+
+    def fetch_dividends(self, symbol: str, period1: int = None) -> List[dict]:
+        return chart_dividends(self.fetch_chart(symbol, "1mo", period1, events="div"))
 
-        return [format_dividend(div) for div in list(raw.values())]
+    def get_historic_prices(
+        self, symbol: str, interval: str = "1mo", max_age_sec: int = PRICES_MAX_AGE_SEC
+    ) -> np.ndarray:
+        # Stored bars are served from memory, then from their file. A file
+        # older than max_age_sec is served as it is and updated in the
+        # background, only a missing one is downloaded before returning.
+        key = f"{symbol}_{interval}"
+        cache_key = f"{HISTORIC_PRICES}_{key}"
+        if max_age_sec > 0:
+            rows = memory_cache.get(cache_key)
+            if rows is not None:
+                return rows
 
-    @cache_factory("./cache", "prices", ttl_sec=60 * 60 * 24)
-    def get_historic_prices(self, symbol: str, interval: str = "1mo") -> dict:
-        url = "https://query2.finance.yahoo.com/v8/finance/chart/{symbol}?range={range}&interval={interval}"
-        res = re.get(
-            url.format(symbol=symbol, range="max", interval=interval),
-            headers={"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64)"},
+        rows = prices_store.load(key)
+        age = prices_store.age(key)
+
+        # Only the window since the last stored price is downloaded, the last
+        # stored bar is fetched again as it may still have been in progress.
+        # Closes are split adjusted, so a split in the window or a week since
+        # the last full download means everything is downloaded again.
+        def fetch() -> np.ndarray:
+            synced_age = prices_store.synced_age(key)
+            if len(rows) > 0 and synced_age is not None and synced_age < RESYNC_SEC:
+                last = int(rows["timestamp"][-1])
+                body = self.fetch_chart(symbol, interval, last, events="split")
+                if not chart_has_splits(body):
+                    return prices_store.merge(key, rows, chart_prices(body))
+
+            return prices_store.replace(key, self.fetch_prices(symbol, interval))
+
+        def update() -> np.ndarray:
+            try:
+                prices = fetch()
+            except Exception as err:
+                # Stored bars are still better than no prices at all
+                if len(rows) == 0:
+                    raise
+
+                print(f"Failed to update {key}, serving stored prices: {err}")
+                return rows
+
+            memory_cache.put(
+                cache_key, prices, prices.nbytes, time.time() + PRICES_MAX_AGE_SEC
+            )
+
+            return prices
+
+        if age is not None and age < max_age_sec:
+            memory_cache.put(
+                cache_key, rows, rows.nbytes, time.time() + max_age_sec - age
+            )
+            return rows
+
+        if age is not None and max_age_sec > 0:
+            refresh_in_background(cache_key, single_flight, cache_key, update)
+            return rows
+
+        return single_flight(cache_key, update)
+
+    def fetch_prices(
+        self, symbol: str, interval: str = "1mo", period1: int = None
+    ) -> np.ndarray:
+        return chart_prices(self.fetch_chart(symbol, interval, period1))
+
+    def fetch_chart(
+        self, symbol: str, interval: str, period1: int = None, events: str = None
+    ) -> dict:
+        # The whole history without period1, the window since it otherwise
+        if period1 is None:
+            url = "https://query2.finance.yahoo.com/v8/finance/chart/{symbol}?range=max&interval={interval}"
+        else:
+            url = "https://query2.finance.yahoo.com/v8/finance/chart/{symbol}?period1={period1}&period2={timestamp}&interval={interval}"
+
+        if events is not None:
+            url += f"&events={events}"
+
+        res = self.session.get(
+            url.format(
+                symbol=symbol,
+                period1=period1,
+                timestamp=int(time.time()),
+                interval=interval,
+            ),
+            timeout=self.timeout,
         )
 
         assert res.status_code == 200, f"Status code is {res.status_code}"
@@ -60,27 +292,20 @@ class YahooFinance:
         body = safeget(res.json(), "chart", "result", 0)
         assert body is not None, "Body of the response is null"
 
-        prices = []
-        for i, t in enumerate(body["timestamp"]):
-            prices.append(
-                {
-                    "timestamp": t,
-                    "date": datetime.fromtimestamp(t).strftime("%d-%m-%Y"),
-                    "open": safeget(body, "indicators", "quote", 0, "open", i),
-                    "close": safeget(body, "indicators", "quote", 0, "close", i),
-                    "high": safeget(body, "indicators", "quote", 0, "high", i),
-                    "low": safeget(body, "indicators", "quote", 0, "low", i),
-                    "volume": safeget(body, "indicators", "quote", 0, "volume", i),
-                }
-            )
+        return body
 
-        return prices
+    def get_cached_symbols(self) -> List[str]:
+        symbols = list_cached("./cache", "snapshot") + list_cached(
+            "./cache", "dividends"
+        )
+
+        return list(dict.fromkeys(symbols))
 
     def search_ticker(self, query: str) -> List[Dict[str, Any]]:
         url = "https://query1.finance.yahoo.com/v1/finance/search?q={query}"
-        res = re.get(
+        res = self.session.get(
             url.format(query=query),
-            headers={"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64)"},
+            timeout=self.timeout,
         )
 
         assert res.status_code == 200, f"Status code is {res.status_code}"
@@ -90,6 +315,79 @@ class YahooFinance:
 
         return body
 
+    def fetchers(self, refresh: bool = False) -> Dict[str, Callable[[str], Any]]:
+        # Fetch function per kind of data, with refresh they skip the cache
+        if refresh:
+            return {
+                TICKER_INFO: functools.partial(
+                    YahooFinance.get_ticker_info.refresh, self
+                ),
+                TICKER_SNAPSHOT: functools.partial(
+                    YahooFinance.get_ticker_snapshot.refresh, self
+                ),
+                HISTORIC_DIVIDENDS: functools.partial(
+                    YahooFinance.get_historic_dividends.refresh, self
+                ),
+                HISTORIC_PRICES: functools.partial(
+                    self.get_historic_prices, max_age_sec=0
+                ),
+            }
+
+        return {
+            TICKER_INFO: self.get_ticker_info,
+            TICKER_SNAPSHOT: self.get_ticker_snapshot,
+            HISTORIC_DIVIDENDS: self.get_historic_dividends,
+            HISTORIC_PRICES: self.get_historic_prices,
+        }
+
+    def get_many(
+        self,
+        symbols: Iterable[str],
+        kinds: Iterable[str] = (TICKER_SNAPSHOT, HISTORIC_DIVIDENDS),
+        refresh: bool = False,
+    ) -> Dict[str, Dict[str, Any]]:
+        # Returns symbol -> kind -> result. A failed fetch is stored as the
+        # raised exception, so one bad symbol never fails the whole batch.
+        # With refresh the cache is bypassed and overwritten with fresh data.
+        fetchers = self.fetchers(refresh)
+        for kind in kinds:
+            assert kind in fetchers, f"Unknown kind {kind}"
+
+        def fetch(symbol: str, kind: str) -> Any:
+            try:
+                return fetchers[kind](symbol)
+            except Exception as err:
+                return err
+
+        symbols = list(dict.fromkeys(symbols))
+        jobs = [(symbol, kind) for symbol in symbols for kind in kinds]
+        if len(jobs) == 0:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            results = pool.map(lambda job: fetch(*job), jobs)
+
+        result = {symbol: {} for symbol in symbols}
+        for (symbol, kind), res in zip(jobs, results):
+            result[symbol][kind] = res
+
+        return result
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_yahoo_finance() -> YahooFinance:
+    # One client per process so every request reuses the same connection pool
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = YahooFinance()
+
+    return _shared
+
 
 if __name__ == "__main__":
     from pprint import pprint